@@ -0,0 +1,92 @@
+""" Comparison of benchmark results between two revisions of the library.
+
+Each revision is checked out in a temporary git worktree and benchmarked by the current ``run.py``, so
+both are measured over identical corpora.  Saved JSON results of ``run.py --output`` may be given instead
+of revisions::
+
+    $ python benchmarks/compare.py main HEAD --size small
+    $ python benchmarks/compare.py before.json after.json
+
+Options after the revisions are passed on to ``run.py``.  Metrics that are worse by more than the
+threshold are marked as regressions, and the exit status is 1 if there are any.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import typing
+
+
+_BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Prefix of the metrics for which larger values are better; for the others, smaller values are better.
+_HIGHER_IS_BETTER_PREFIX = 'throughput_'
+
+
+def _git(args: typing.List[str], cwd: str) -> str:
+    return subprocess.run(['git', *args], cwd=cwd, check=True, stdout=subprocess.PIPE,
+                          universal_newlines=True).stdout.strip()
+
+
+def benchmark_revision(rev: str, run_args: typing.List[str], repo_root: str) -> dict:
+    """ Return the results of ``run.py`` for the library as of ``rev``, or as saved in a JSON file.  """
+    if rev.endswith('.json') and os.path.isfile(rev):
+        with open(rev) as results_file:
+            return json.load(results_file)
+
+    commit = _git(['rev-parse', '--verify', rev + '^{commit}'], cwd=repo_root)
+    with tempfile.TemporaryDirectory(prefix='codeowners-bench-') as temp_dir:
+        worktree = os.path.join(temp_dir, 'worktree')
+        _git(['worktree', 'add', '--detach', worktree, commit], cwd=repo_root)
+        try:
+            output_path = os.path.join(temp_dir, 'results.json')
+            env = dict(os.environ, PYTHONPATH=worktree)
+            print('Benchmarking {} ({})'.format(rev, commit[:12]), file=sys.stderr)
+            subprocess.run([sys.executable, os.path.join(_BENCHMARKS_DIR, 'run.py'), *run_args,
+                            '--output', output_path], env=env, check=True, stdout=sys.stderr)
+            with open(output_path) as results_file:
+                return json.load(results_file)
+        finally:
+            _git(['worktree', 'remove', '--force', worktree], cwd=repo_root)
+
+
+def compare(old: dict, new: dict, threshold: float) -> typing.Iterator[typing.Tuple[str, float, float, float, bool]]:
+    """ Generate the name, old and new values, relative change and regression flag of each common metric.  """
+    for name, old_value in old['results'].items():
+        new_value = new['results'].get(name)
+        if new_value is None:
+            continue
+        change = (new_value - old_value) / old_value if old_value else 0.0
+        worse = -change if name.startswith(_HIGHER_IS_BETTER_PREFIX) else change
+        yield name, old_value, new_value, change, worse > threshold
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('old', help='Baseline revision, or JSON results file.')
+    parser.add_argument('new', help='Revision, or JSON results file, to compare to the baseline.')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative change beyond which a worse metric is a regression.  Default: 0.10.')
+    args, run_args = parser.parse_known_args(argv)
+
+    repo_root = _git(['rev-parse', '--show-toplevel'], cwd=_BENCHMARKS_DIR)
+    old = benchmark_revision(args.old, run_args, repo_root)
+    new = benchmark_revision(args.new, run_args, repo_root)
+    if old.get('parameters') != new.get('parameters'):
+        print('Warning: parameters differ: {} and {}'.format(old.get('parameters'), new.get('parameters')),
+              file=sys.stderr)
+
+    row_format = '{:<45} {:>14} {:>14} {:>9}  {}'
+    print(row_format.format('METRIC', args.old, args.new, 'CHANGE', ''))
+    regressions = 0
+    for name, old_value, new_value, change, regression in compare(old, new, args.threshold):
+        regressions += regression
+        print(row_format.format(name, '{:.6g}'.format(old_value), '{:.6g}'.format(new_value),
+                                '{:+.1%}'.format(change), 'REGRESSION' if regression else '').rstrip())
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+""" Deterministic generators of synthetic CODEOWNERS files and path corpora.
+
+The same seed always generates the same rules and paths, so results of different revisions are comparable.
+Paths are generated by a depth-first walk of a synthetic tree, in sorted order as listed by git, and the
+rules name directories of the same tree, so that they match realistic shares of the paths.
+"""
+import itertools
+import random
+import typing
+
+
+# Names of subdirectories, at every depth below the projects at the root.
+DIRECTORY_NAMES = ['api', 'build', 'cmd', 'core', 'data', 'docs', 'internal', 'lib', 'pkg', 'scripts', 'src',
+                   'test', 'tests', 'tools', 'vendor', 'web']
+
+FILE_EXTENSIONS = ['.py', '.py', '.py', '.c', '.h', '.go', '.js', '.md', '.json', '.yaml', '.txt', '']
+
+FILE_STEMS = ['main', 'util', 'config', 'handler', 'model', 'test_main', 'test_util', 'index', 'README',
+              'Makefile', 'setup', 'schema', 'client', 'server', 'types', 'errors']
+
+TEAMS = ['@org/team-{}'.format(i) for i in range(200)]
+
+MAX_DEPTH = 10
+
+
+def project_name(i: int) -> str:
+    """ Return the name of the ``i``-th directory at the root of the tree.  """
+    return 'project{:05d}'.format(i)
+
+
+def _directory_entries(rnd: random.Random, depth: int) -> typing.Tuple[typing.List[str], typing.List[str]]:
+    """ Return the sorted file and subdirectory names of a directory ``depth`` components deep.  """
+    file_names = sorted({rnd.choice(FILE_STEMS) + rnd.choice(FILE_EXTENSIONS) for _ in range(rnd.randint(1, 12))})
+    # Fan-out decreases with depth, so the tree is bushy near the root, with a few long, thin chains below.
+    if depth == 1:
+        subdir_count = rnd.randint(3, 10)
+    elif depth < 4:
+        subdir_count = rnd.randint(0, 3)
+    elif depth < MAX_DEPTH:
+        subdir_count = int(rnd.random() < 0.4)
+    else:
+        subdir_count = 0
+    subdir_names = sorted(rnd.sample(DIRECTORY_NAMES, subdir_count))
+    return file_names, subdir_names
+
+
+def _walk(rnd: random.Random, dir_path: str, depth: int) -> typing.Iterator[str]:
+    file_names, subdir_names = _directory_entries(rnd, depth)
+    # Interleave files and subdirectories by name, as git lists them.
+    entries = sorted([(name, False) for name in file_names] + [(name + '/', True) for name in subdir_names])
+    for name, is_dir in entries:
+        if is_dir:
+            yield from _walk(rnd, dir_path + name, depth + 1)
+        else:
+            yield dir_path + name
+
+
+def generate_paths(count: int, seed: int = 0) -> typing.Iterator[str]:
+    """ Generate ``count`` file paths, relative to the root of a synthetic tree, in sorted order.
+
+    Paths are generated lazily, so a corpus of millions of paths need not be held in memory.
+    """
+    rnd = random.Random(seed)
+    projects = (_walk(rnd, project_name(i) + '/', depth=1) for i in itertools.count())
+    return itertools.islice(itertools.chain.from_iterable(projects), count)
+
+
+def project_count(path_count: int) -> int:
+    """ Return the approximate number of root directories in a corpus of ``path_count`` paths.  """
+    # The mean number of files per project, as measured over the default seed.
+    return max(1, path_count // 265)
+
+
+def generate_codeowners(rule_count: int, path_count: int = 100000, seed: int = 0) -> typing.List[str]:
+    """ Return the lines of a CODEOWNERS file of ``rule_count`` rules, and a few comments.
+
+    Most rules are anchored at project directories of a corpus of ``path_count`` paths; the rest are
+    suffix rules, '**' rules, directory-only rules and unanchored rules of a single component, in
+    proportions resembling those of large monorepos.
+    """
+    rnd = random.Random(seed)
+    projects = project_count(path_count)
+
+    def directory():
+        depth = rnd.choice([0, 1, 1, 2, 2, 3])
+        return '/'.join([project_name(rnd.randrange(projects))] + rnd.sample(DIRECTORY_NAMES, depth))
+
+    def owners():
+        return ' '.join(rnd.sample(TEAMS, rnd.choice([1, 1, 1, 2, 3])))
+
+    def rule():
+        kind = rnd.random()
+        if kind < 0.55:
+            return '/{}/'.format(directory())
+        if kind < 0.70:
+            return '/{}/*{}'.format(directory(), rnd.choice(FILE_EXTENSIONS[:-1]))
+        if kind < 0.78:
+            return '*{}'.format(rnd.choice(FILE_EXTENSIONS[:-1]))
+        if kind < 0.88:
+            # No pattern ends in '**', which older revisions do not support, so that they can be compared.
+            return rnd.choice(['{}/**/{}*'.format(directory(), rnd.choice(FILE_STEMS)),
+                               '**/{}/*{}'.format(rnd.choice(DIRECTORY_NAMES), rnd.choice(FILE_EXTENSIONS[:-1]))])
+        if kind < 0.96:
+            return '{}/'.format(rnd.choice(DIRECTORY_NAMES))
+        return rnd.choice(FILE_STEMS)
+
+    lines = ['# Synthetic CODEOWNERS file, seed {}'.format(seed), '* @org/default']
+    for i in range(rule_count - 1):
+        if i % 50 == 0:
+            lines.append('')
+            lines.append('# Section {}'.format(i // 50))
+        lines.append('{}  {}'.format(rule(), owners()))
+    return lines
@@ -0,0 +1,198 @@
+""" Benchmarks of parsing and matching, over synthetic CODEOWNERS files and path corpora.
+
+Measures the time to parse a CODEOWNERS file and to load its rules from the on-disk cache, the latency of
+matching single paths in random order, the throughput of matching a full sorted listing, with match_many and
+with each matcher one path at a time, and the peak memory allocated while parsing and matching.
+Results are printed as a table, and optionally written as JSON for ``compare.py``::
+
+    $ python benchmarks/run.py --size medium --output medium.json
+
+The ``codeowners`` package is imported from ``PYTHONPATH`` if it is set there, and otherwise from the
+parent directory, so the same benchmarks can measure other checkouts of the library.  Matchers missing
+from older revisions are skipped.
+"""
+import argparse
+import collections
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing
+
+# Appended, so a checkout of the library given in PYTHONPATH takes precedence.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus  # noqa: E402
+from codeowners import codeowners  # noqa: E402
+try:
+    from codeowners import cache
+except ImportError:
+    # Older revisions of the library have no cache.
+    cache = None
+
+
+# Numbers of rules and of paths of each corpus size.
+SIZES = {
+    'tiny': (100, 10000),
+    'small': (1000, 100000),
+    'medium': (10000, 1000000),
+    'large': (50000, 5000000),
+}
+
+
+def _median_seconds(function: typing.Callable[[], typing.Any], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def _cache_load_seconds(lines: typing.List[str], repeat: int) -> float:
+    """ Return the time to load the rules of ``lines`` from an existing entry of the on-disk cache.  """
+    text = ''.join(line + '\n' for line in lines)
+    with tempfile.TemporaryDirectory(prefix='codeowners-bench-') as cache_dir:
+        cache.cached_rules(text, 'CODEOWNERS', cache_dir=cache_dir)
+        return _median_seconds(lambda: cache.cached_rules(text, 'CODEOWNERS', cache_dir=cache_dir), repeat)
+
+
+def _percentile(sorted_values: typing.Sequence[float], fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def _matchers(rules) -> typing.Dict[str, typing.Callable[[str], typing.Any]]:
+    """ Return the functions matching a single path with each matcher available in the library.  """
+    matchers = {'match': lambda path: codeowners.match(rules, path)}
+    for name in ['CompiledRuleSet', 'RuleIndex', 'ScopedMatcher']:
+        matcher_class = getattr(codeowners, name, None)
+        if matcher_class is not None:
+            matchers[name] = matcher_class(rules).match
+    return matchers
+
+
+def _match_all(rules, paths: typing.Iterable[str]) -> int:
+    """ Match every path, as listing the owners of a repository does, and return the number of paths.  """
+    match_many = getattr(codeowners, 'match_many', None)
+    if match_many is not None:
+        results = match_many(rules, paths)
+    else:
+        results = ((path, codeowners.match(rules, path)) for path in paths)
+    count = 0
+    for count, _ in enumerate(results, start=1):
+        pass
+    return count
+
+
+def _peak_memory(function: typing.Callable[[], typing.Any]) -> int:
+    """ Return the peak number of bytes allocated by ``function``, beyond those allocated before the call.  """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(rule_count: int, path_count: int, seed: int = 0, repeat: int = 5, latency_samples: int = 1000,
+        memory: bool = True) -> typing.Dict[str, float]:
+    """ Return the results of every benchmark, keyed by metric name.
+
+    Times are in seconds, except latencies, in microseconds; throughputs are in paths per second, and peak
+    memory in bytes.
+    """
+    lines = corpus.generate_codeowners(rule_count, path_count=path_count, seed=seed)
+    results = {}
+
+    results['parse_seconds'] = _median_seconds(lambda: codeowners.parse_codeowners(lines, 'CODEOWNERS'), repeat)
+    rules = codeowners.parse_codeowners(lines, 'CODEOWNERS')
+    if cache is not None:
+        results['cache_load_seconds'] = _cache_load_seconds(lines, repeat)
+
+    sample = list(itertools.islice(corpus.generate_paths(path_count, seed=seed), 0, None,
+                                   max(1, path_count // latency_samples)))[:latency_samples]
+    random.Random(seed).shuffle(sample)
+    for name, match in _matchers(rules).items():
+        # Match once beforehand, so lazily compiled state is not counted in the latency.
+        match(sample[0])
+        latencies = []
+        for path in sample:
+            start = time.perf_counter()
+            match(path)
+            latencies.append((time.perf_counter() - start) * 1e6)
+        latencies.sort()
+        for label, fraction in [('p50', 0.5), ('p95', 0.95), ('p99', 0.99)]:
+            results['latency_{}_{}_us'.format(name, label)] = _percentile(latencies, fraction)
+
+    generate_seconds = _median_seconds(lambda: list(corpus.generate_paths(path_count, seed=seed)), 1)
+    # Generating the paths is part of the measured times; subtract it, as listing files is not benchmarked.
+    match_seconds = _median_seconds(lambda: _match_all(rules, corpus.generate_paths(path_count, seed=seed)), 1)
+    results['throughput_paths_per_second'] = path_count / max(match_seconds - generate_seconds, 1e-9)
+    for name, match in _matchers(rules).items():
+        if name == 'match':
+            # As slow as the listing of the library before match_many, which the metric above measures.
+            continue
+        match_seconds = _median_seconds(
+            lambda: collections.deque(map(match, corpus.generate_paths(path_count, seed=seed)), maxlen=0), 1)
+        results['throughput_{}_paths_per_second'.format(name)] = (
+            path_count / max(match_seconds - generate_seconds, 1e-9))
+
+    if memory:
+        results['peak_parse_bytes'] = _peak_memory(lambda: codeowners.parse_codeowners(lines, 'CODEOWNERS'))
+        results['peak_match_bytes'] = _peak_memory(
+            lambda: _match_all(rules, corpus.generate_paths(path_count, seed=seed)))
+    return results
+
+
+def format_results(results: typing.Dict[str, float]) -> typing.Iterator[str]:
+    """ Generate the lines of a human-readable table of benchmark results.  """
+    row_format = '{:<45} {:>16}'
+    yield row_format.format('METRIC', 'VALUE')
+    for name, value in results.items():
+        yield row_format.format(name, '{:.6g}'.format(value))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', choices=sorted(SIZES), default='small',
+                        help='Numbers of rules and paths of the corpus.  Default: small.')
+    parser.add_argument('--rules', type=int, help='Number of rules, overriding --size.')
+    parser.add_argument('--paths', type=int, help='Number of paths, overriding --size.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the corpus generators.  Default: 0.')
+    parser.add_argument('--repeat', type=int, default=5, help='Repetitions of the parse benchmark.  Default: 5.')
+    parser.add_argument('--latency-samples', type=int, default=1000,
+                        help='Number of paths matched one by one for latency.  Default: 1000.')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='Skip the peak memory benchmarks, which match every path again under tracemalloc.')
+    parser.add_argument('--output', help='Write the results, and the parameters, as JSON to this file.')
+    args = parser.parse_args(argv)
+
+    rule_count, path_count = SIZES[args.size]
+    rule_count = args.rules or rule_count
+    path_count = args.paths or path_count
+    print('Benchmarking {} rules and {} paths, with codeowners from {}'.format(
+        rule_count, path_count, os.path.dirname(codeowners.__file__)), file=sys.stderr)
+
+    results = run(rule_count, path_count, seed=args.seed, repeat=args.repeat,
+                  latency_samples=args.latency_samples, memory=args.memory)
+    for line in format_results(results):
+        print(line)
+
+    if args.output:
+        parameters = {'rules': rule_count, 'paths': path_count, 'seed': args.seed,
+                      'python': platform.python_version()}
+        with open(args.output, 'w') as output_file:
+            json.dump({'parameters': parameters, 'results': results}, output_file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
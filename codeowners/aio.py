@@ -0,0 +1,205 @@
+""" Ownership lookups for asyncio applications, without blocking the event loop.
+
+git output is streamed from subprocesses created by ``asyncio.create_subprocess_exec``, and matching runs
+in an executor, one chunk of paths at a time, while the next chunk is read.  For example::
+
+    rules = await loop.run_in_executor(None, cache.load_rules, codeowners_path)
+    paths = aio.async_list_files(['src'], cwd=repo_root, timeout=60)
+    for path, match_result in await aio.async_match_paths(rules, paths, timeout=60):
+        ...
+
+Cancelling the awaiting task, or exceeding a timeout, kills the git process.  A chunk being matched
+completes in the executor, but no further chunk is submitted.
+"""
+import asyncio
+import os
+from pathlib import Path
+import subprocess
+import typing
+
+from codeowners import codeowners, fs_utils
+
+
+# Size of reads from the stdout pipe of git subprocesses.
+_READ_CHUNK_SIZE = 1 << 20
+
+
+class _Deadline:
+    """ The time by which an operation given ``timeout`` seconds, or None for no limit, must complete.  """
+
+    def __init__(self, loop, timeout: typing.Optional[float]):
+        self._loop = loop
+        self._end = loop.time() + timeout if timeout is not None else None
+
+    def remaining(self) -> typing.Optional[float]:
+        return max(0.0, self._end - self._loop.time()) if self._end is not None else None
+
+    def wait_for(self, awaitable):
+        return asyncio.wait_for(awaitable, self.remaining())
+
+
+class GitEntryStream:
+    """ An asynchronous iterator of the NUL-terminated entries written to stdout by a git command.
+
+    The process is started on the first iteration, and entries are generated as they arrive.  Raises
+    ``subprocess.CalledProcessError`` once the output is exhausted, if git failed, and
+    ``asyncio.TimeoutError`` if the command has not completed within ``timeout`` seconds of starting.  The
+    git process is killed on error, on timeout, on cancellation, or by ``aclose``; the stream is also an
+    asynchronous context manager, which closes it on exit.
+    """
+
+    def __init__(self, args: typing.Sequence[str], cwd=None, timeout: typing.Optional[float] = None):
+        self.args = ['git', *args]
+        self.cwd = cwd
+        self.timeout = timeout
+        self._process = None
+        self._deadline = None
+        self._entries = []
+        self._remainder = b''
+        self._done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        try:
+            while not self._entries:
+                if self._done:
+                    raise StopAsyncIteration
+                await self._read()
+        except (Exception, asyncio.CancelledError):
+            await self.aclose()
+            raise
+        return os.fsdecode(self._entries.pop())
+
+    async def _read(self):
+        if self._process is None:
+            loop = asyncio.get_event_loop()
+            self._deadline = _Deadline(loop, self.timeout)
+            self._process = await self._deadline.wait_for(asyncio.create_subprocess_exec(
+                *self.args, cwd=None if self.cwd is None else str(self.cwd), stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE))
+
+        chunk = await self._deadline.wait_for(self._process.stdout.read(_READ_CHUNK_SIZE))
+        if chunk:
+            *entries, self._remainder = (self._remainder + chunk).split(b'\0')
+            # Stored in reverse, so entries are popped in order.
+            self._entries = entries[::-1]
+            return
+
+        self._done = True
+        if self._remainder:
+            self._entries = [self._remainder]
+        if await self._deadline.wait_for(self._process.wait()) != 0:
+            raise subprocess.CalledProcessError(self._process.returncode, self.args)
+
+    async def aclose(self):
+        """ Kill the git process, if it is still running.  """
+        self._done = True
+        self._entries = []
+        if self._process is not None and self._process.returncode is None:
+            self._process.kill()
+            await self._process.wait()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+class _MappedStream:
+    def __init__(self, function, stream):
+        self._function = function
+        self._stream = stream
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return self._function(await self._stream.__anext__())
+
+    async def aclose(self):
+        await self._stream.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+async def async_git_repository_root(base_dir: Path, search_parent_directories=True) -> Path:
+    """ Return the root of the git repository containing ``base_dir``, like ``fs_utils.git_repository_root``,
+    examining the filesystem in the default executor.  """
+    return await asyncio.get_event_loop().run_in_executor(
+        None, lambda: fs_utils.git_repository_root(base_dir, search_parent_directories=search_parent_directories))
+
+
+def async_list_files(paths: typing.Iterable[Path], untracked: bool = False, cwd=None,
+                     timeout: typing.Optional[float] = None):
+    """ Return an asynchronous iterator of Paths of the non-ignored files recognized by git among ``paths``,
+    like ``fs_utils.list_files``, streamed from ``git ls-files`` run in ``cwd``.
+
+    The iterator has the timeout, closing and cancellation behavior of a ``GitEntryStream``.
+    """
+    tracked_options = ['--cached', '--others'] if untracked else ['--cached']
+    return _MappedStream(Path, GitEntryStream(['ls-files', '-z', *tracked_options, '--', *map(str, paths)],
+                                              cwd=cwd, timeout=timeout))
+
+
+def _match_chunk(matcher: codeowners.ScopedMatcher, chunk: list):
+    rules = matcher.rules
+    return [(path, rules[index].result(path) if index is not None else None)
+            for path, index in matcher.match_indices((path, False) for path in chunk)]
+
+
+async def _next_chunk(paths, chunk_size: int) -> list:
+    """ Return the next ``chunk_size`` items of an iterator, or of an asynchronous iterator.  """
+    chunk = []
+    if hasattr(paths, '__anext__'):
+        async for path in paths:
+            chunk.append(path)
+            if len(chunk) == chunk_size:
+                break
+    else:
+        for path in paths:
+            chunk.append(path)
+            if len(chunk) == chunk_size:
+                break
+    return chunk
+
+
+async def async_match_paths(rules: typing.Iterable[codeowners.Rule], paths, chunk_size: int = 4096,
+                            executor=None, timeout: typing.Optional[float] = None
+                            ) -> typing.List[typing.Tuple[typing.Any, typing.Optional[codeowners.MatchResult]]]:
+    """ Return pairs of each file path among ``paths`` and its MatchResult, or None, like
+    ``codeowners.match_many``.
+
+    ``paths`` may be an iterable, or an asynchronous iterable, such as returned by ``async_list_files``.
+    Chunks of ``chunk_size`` paths are matched in ``executor``, by default the event loop's default
+    executor, which must be a thread pool, one chunk at a time, while the next chunk is collected.  Raises
+    ``asyncio.TimeoutError`` if matching has not completed within ``timeout`` seconds; an asynchronous
+    iterable of paths with a ``aclose`` method is closed on timeout, on error and on cancellation.
+    """
+    loop = asyncio.get_event_loop()
+    deadline = _Deadline(loop, timeout)
+    matcher = codeowners.ScopedMatcher(rules)
+    if not hasattr(paths, '__anext__'):
+        paths = iter(paths)
+
+    results = []
+    pending = None
+    try:
+        while True:
+            chunk = await deadline.wait_for(_next_chunk(paths, chunk_size))
+            if pending is not None:
+                results.extend(await deadline.wait_for(pending))
+                pending = None
+            if not chunk:
+                return results
+            pending = loop.run_in_executor(executor, _match_chunk, matcher, chunk)
+    except (Exception, asyncio.CancelledError):
+        if hasattr(paths, 'aclose'):
+            await paths.aclose()
+        raise
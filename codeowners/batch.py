@@ -0,0 +1,133 @@
+""" Ownership of the files of many repositories, matched concurrently by a pool of worker processes.
+
+Repositories often share identical CODEOWNERS files.  Rules are parsed once per distinct content, keyed
+by ``cache.content_key`` of the text and of its location relative to the repository root, in the main
+process and in each worker, and are shared by all repositories with the same rules.
+"""
+import collections
+from collections import namedtuple
+import io
+import multiprocessing
+import os
+from pathlib import Path
+import typing
+
+from codeowners import cache, codeowners, fs_utils
+
+
+class RepositoryRules(namedtuple('RepositoryRulesData', 'root, key, text, source_filename')):
+    """ The CODEOWNERS content of a repository, with ``source_filename`` relative to its ``root``.  """
+
+    @classmethod
+    def read(cls, repo_path: Path) -> 'RepositoryRules':
+        root = fs_utils.git_repository_root(Path(repo_path))
+        location = fs_utils.codeowners_path(root)
+        with open(str(location), 'r') as codeowners_file:
+            text = codeowners_file.read()
+        source_filename = location.relative_to(root)
+        return cls(root, cache.content_key(text, source_filename), text, source_filename)
+
+
+class RulesCache:
+    """ Rules parsed from CODEOWNERS contents, each parsed once, and optionally stored in the on-disk cache.  """
+
+    def __init__(self, use_cache: bool = False):
+        self.use_cache = use_cache
+        self._rules = {}
+
+    def __len__(self):
+        return len(self._rules)
+
+    def rules(self, repository: RepositoryRules) -> typing.List[codeowners.Rule]:
+        rules = self._rules.get(repository.key)
+        if rules is None:
+            if self.use_cache:
+                rules = cache.cached_rules(repository.text, source_filename=repository.source_filename)
+            else:
+                rules = codeowners.parse_codeowners(io.StringIO(repository.text),
+                                                    source_filename=repository.source_filename)
+            self._rules[repository.key] = rules
+        return rules
+
+
+# Rules of each worker process, created once by the pool initializer.
+_worker_rules = None
+
+
+def _init_worker(use_cache):
+    global _worker_rules
+    _worker_rules = RulesCache(use_cache)
+
+
+def _match_repository(repository: RepositoryRules, rules_cache: RulesCache, untracked: bool):
+    """ Return the paths of the files of ``repository``, and the indices of the rules matching them.  """
+    matcher = codeowners.ScopedMatcher(rules_cache.rules(repository))
+    tracked_options = ['--cached', '--others'] if untracked else ['--cached']
+    paths = list(fs_utils.git_output_entries(['ls-files', '-z', *tracked_options], cwd=str(repository.root)))
+    return paths, [index for _, index in matcher.match_indices((path, False) for path in paths)]
+
+
+def _match_in_worker(repository, untracked):
+    return _match_repository(repository, _worker_rules, untracked)
+
+
+def _raise(repo_path, error):
+    raise error
+
+
+def batch_match(repo_paths: typing.Iterable[Path], jobs: int = None, use_cache: bool = False, untracked: bool = False,
+                on_error: typing.Callable[[Path, Exception], None] = _raise, rules_cache: RulesCache = None
+                ) -> typing.Iterator[typing.Tuple[Path, str, typing.Optional[codeowners.MatchResult]]]:
+    """ Generate the repository path, the file path and the MatchResult, or None, of each file tracked by git,
+    and also untracked if ``untracked`` is true, in each of the repositories at ``repo_paths``.
+
+    Repositories are matched by ``jobs`` worker processes (by default, one per CPU), and their results are
+    generated in the order of ``repo_paths``, each repository's files together in sorted order.  File paths
+    are relative to the repository root.  At most two repositories per worker are in flight.  Errors of a
+    repository, such as a missing CODEOWNERS file, are passed to ``on_error`` with its path, by default
+    re-raising them, and the remaining repositories are processed.  Rules are parsed in ``rules_cache``, if
+    given, so they can be shared with other calls.
+    """
+    rules_cache = rules_cache if rules_cache is not None else RulesCache(use_cache)
+
+    def results(repo_path, repository, paths, indices):
+        rules = rules_cache.rules(repository)
+        for path, index in zip(paths, indices):
+            yield repo_path, path, (rules[index].result(path) if index is not None else None)
+
+    def read_repositories():
+        for repo_path in repo_paths:
+            try:
+                yield repo_path, RepositoryRules.read(repo_path)
+            except (OSError, UnicodeDecodeError) as e:
+                on_error(repo_path, e)
+
+    if jobs == 1:
+        for repo_path, repository in read_repositories():
+            try:
+                paths, indices = _match_repository(repository, rules_cache, untracked)
+            except Exception as e:
+                on_error(repo_path, e)
+                continue
+            yield from results(repo_path, repository, paths, indices)
+        return
+
+    jobs = jobs or os.cpu_count() or 1
+    with multiprocessing.Pool(jobs, initializer=_init_worker, initargs=(use_cache,)) as pool:
+        max_pending = 2 * jobs
+        pending = collections.deque()
+
+        def finish(repo_path, repository, async_result):
+            try:
+                paths, indices = async_result.get()
+            except Exception as e:
+                on_error(repo_path, e)
+                return iter(())
+            return results(repo_path, repository, paths, indices)
+
+        for repo_path, repository in read_repositories():
+            pending.append((repo_path, repository, pool.apply_async(_match_in_worker, (repository, untracked))))
+            if len(pending) >= max_pending:
+                yield from finish(*pending.popleft())
+        while pending:
+            yield from finish(*pending.popleft())
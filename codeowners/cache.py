@@ -0,0 +1,125 @@
+""" On-disk cache of parsed CODEOWNERS rules.
+
+Entries are keyed by a hash of the CODEOWNERS content, its file name and the library code, so a changed
+file or a changed library never sees stale rules.
+
+Parsing compiles patterns lazily, so it mostly builds the same ``PurePath`` objects that unpickling an entry
+does, and loading cached rules is no faster than parsing them.  The cache is therefore used only on request.
+"""
+import functools
+import hashlib
+import io
+import logging
+import os
+from pathlib import Path
+import pickle
+import tempfile
+import typing
+
+import codeowners as _package
+from codeowners import codeowners
+
+
+_logger = logging.getLogger(__file__)
+
+# Default bound on the total size of the cache directory, in bytes.
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+
+def default_cache_directory() -> Path:
+    """ Return the cache directory, following the XDG base directory specification.  """
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'codeowners'
+
+
+@functools.lru_cache(maxsize=None)
+def code_fingerprint() -> str:
+    """ Return a fingerprint of the matching code, identifying the build that stored cached data.  """
+    # The cached rules are pickled, so they depend on the layout of the classes, not only on the version.
+    try:
+        with open(codeowners.__file__, 'rb') as source_file:
+            return hashlib.sha256(source_file.read()).hexdigest()
+    except OSError:
+        return _package.__version__
+
+
+def content_key(text: str, source_filename) -> str:
+    """ Return the cache key of CODEOWNERS content read from ``source_filename``.  """
+    digest = hashlib.sha256()
+    for item in (_package.__version__, code_fingerprint(), str(source_filename), text):
+        digest.update(item.encode('utf-8', 'surrogateescape'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def load_rules(path: Path, cache_dir: typing.Optional[Path] = None,
+               max_size: int = DEFAULT_MAX_SIZE) -> typing.List[codeowners.Rule]:
+    """ Return the rules parsed from the CODEOWNERS file at ``path``, from the cache if possible.
+
+    Rules that are not yet cached are parsed and stored.  Unreadable cache entries are ignored and
+    replaced.  After storing, the least recently used entries are evicted until the cache directory is no
+    larger than ``max_size`` bytes.
+    """
+    with open(str(path), 'r') as codeowners_file:
+        text = codeowners_file.read()
+    return cached_rules(text, source_filename=path, cache_dir=cache_dir, max_size=max_size)
+
+
+def cached_rules(text: str, source_filename, cache_dir: typing.Optional[Path] = None,
+                 max_size: int = DEFAULT_MAX_SIZE) -> typing.List[codeowners.Rule]:
+    """ Return the rules parsed from CODEOWNERS ``text``, from the cache if possible.  """
+    cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_directory()
+    entry_path = cache_dir / (content_key(text, source_filename) + '.pickle')
+
+    try:
+        with open(str(entry_path), 'rb') as entry_file:
+            rules = pickle.load(entry_file)
+        os.utime(str(entry_path))
+        return rules
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        _logger.warning('Ignoring unreadable cache entry %s: %s', entry_path, e)
+
+    rules = codeowners.parse_codeowners(io.StringIO(text), source_filename=source_filename)
+    try:
+        _store(entry_path, rules)
+        evict(cache_dir, max_size=max_size)
+    except OSError as e:
+        _logger.warning('Could not store cache entry %s: %s', entry_path, e)
+    return rules
+
+
+def _store(entry_path: Path, rules):
+    entry_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    # Write to a temporary file and rename it, so concurrent readers never see a partial entry.
+    fd, temp_name = tempfile.mkstemp(dir=str(entry_path.parent), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            pickle.dump(rules, temp_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_name, str(entry_path))
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+
+
+def evict(cache_dir: Path, max_size: int = DEFAULT_MAX_SIZE, pattern: str = '*.pickle'):
+    """ Remove the least recently used entries, the files matching the glob ``pattern``, until their
+    total size is no larger than ``max_size`` bytes.  """
+    entries = []
+    for entry_path in Path(cache_dir).glob(pattern):
+        try:
+            stat = entry_path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, entry_path in sorted(entries):
+        if total_size <= max_size:
+            break
+        try:
+            entry_path.unlink()
+        except FileNotFoundError:
+            pass
+        total_size -= size
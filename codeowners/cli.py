@@ -1,38 +1,408 @@
 """Console script for codeowners."""
+import collections
+import itertools
+import json
 from pathlib import Path
 import sys
 
 import click
 
-from codeowners import codeowners, fs_utils
+# Modules needed only by some commands are imported by those commands, so that short-lived commands, such as
+# query, start quickly.
+from codeowners import codeowners, fs_utils, output, profiling
 
 
-@click.command()
+class DefaultCommandGroup(click.Group):
+    """ A group of commands that invokes a default command when the arguments do not name a command.  """
+
+    def __init__(self, *args, default_command: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
+
+    def parse_args(self, ctx, args):
+        if not args or (args[0] not in self.commands and args[0] not in ctx.help_option_names + ['--version']):
+            args = [self.default_command, *args]
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultCommandGroup, default_command='list')
 @click.version_option()
+def main():
+    """ Identify the owners of files under Github's CODEOWNERS feature.
+
+    Without a command, lists the owners of files, as the list command does.
+    """
+
+
+@main.command('list')
 @click.option('--only-tracked/--include-untracked', is_flag=True, default=True,
               help='Include only files tracked by git in output, or include untracked files.  '
                    'Default: include only tracked files.')
 @click.option('--recurse/--no-recurse', is_flag=True, default=True, help='Recursively walk the filesystem.  '
               'Default: recurses.')
+@click.option('--jobs', '-j', type=click.IntRange(min=0), default=1,
+              help='Number of worker processes used for matching; 0 uses one per CPU.  Default: 1.')
+@click.option('--cache/--no-cache', 'use_cache', is_flag=True, default=False,
+              help='Reuse parsed CODEOWNERS rules from the on-disk cache.  Loading rules from the cache is no faster '
+                   'than parsing them, so this only helps where reading the CODEOWNERS file is slow.  Default: does '
+                   'not use the cache.')
+@click.option('--incremental', is_flag=True, default=False,
+              help='Report owners of the files committed at HEAD, updating a stored snapshot of an ancestor commit '
+                   'with only the files that changed since.')
+@click.option('--commits', metavar='REV',
+              help='Report owners of the files among PATHS modified by a commit, or by the commits of a range such '
+                   'as main..my_feature_branch.')
+@click.option('--rev', 'revs', metavar='REV', multiple=True,
+              help='Report owners of the files committed in REV, under its own CODEOWNERS file, without checking it '
+                   'out.  May be given several times.  Each result is prefixed by its revision.')
+@click.option('--owner', metavar='OWNER',
+              help='Report only the files owned by OWNER, such as @org/team-x, and their count.')
+@click.option('--coverage', type=click.Choice(['table', 'json']),
+              help='Report the ownership coverage of each directory, as a table or as JSON, instead of each file.')
+@click.option('--max-depth', type=click.IntRange(min=0), help='Limit the coverage report to directories at most '
+              'this deep.')
+@click.option('--rule-stats', is_flag=True, default=False,
+              help='Report the number of files for which each rule decides ownership, and rules that never do.')
+@click.option('--format', 'output_format', type=click.Choice(output.FORMATS), default='text',
+              help='Format of the owners of each file: text lines, a JSON array, JSON lines, CSV, or NUL-terminated '
+                   'fields.  Default: text.')
+@click.option('--profile', is_flag=True, default=False,
+              help='Report the time spent in each phase, and the most costly rules, on stderr.  Matches in a '
+                   'single process.')
 @click.argument('paths', type=click.Path(), nargs=-1)
-def main(paths, only_tracked, recurse):
-    click.echo('Paths: {}'.format(paths))
+def list_owners(paths, only_tracked, recurse, jobs, use_cache, incremental, commits, revs, owner, coverage,
+                max_depth, rule_stats, output_format, profile):
+    """ List the owners of each file among PATHS.  """
+    if not profile:
+        return _list_owners(paths, only_tracked, recurse, jobs, use_cache, incremental, commits, revs, owner,
+                            coverage, max_depth, rule_stats, output_format)
+
+    with profiling.profile() as profiler:
+        # Evaluations in worker processes would not be recorded.
+        status = _list_owners(paths, only_tracked, recurse, 1, use_cache, incremental, commits, revs, owner,
+                              coverage, max_depth, rule_stats, output_format)
+    for line in profiling.format_report(profiler):
+        click.echo(line, err=True)
+    return status
+
+
+def _list_owners(paths, only_tracked, recurse, jobs, use_cache, incremental, commits, revs, owner, coverage,
+                 max_depth, rule_stats, output_format):
+    from codeowners import cache, parallel
+
+    click.echo('Paths: {}'.format(paths), err=True)
     if len(paths) == 0:
         paths = ('.',)
 
-    paths = fs_utils.list_files(paths, untracked=not only_tracked, recursive=recurse)
+    if owner is not None and (coverage is not None or rule_stats):
+        raise click.UsageError('--owner cannot be combined with --coverage or --rule-stats.')
+    if coverage is not None and rule_stats:
+        raise click.UsageError('--coverage cannot be combined with --rule-stats.')
+
+    if incremental:
+        _reject_options('--incremental', [('--commits', commits is not None), ('--rev', bool(revs)),
+                                          ('--jobs', jobs != 1), ('--include-untracked', not only_tracked)])
+        rules, results = _incremental_results(paths, use_cache)
+        return _report(rules, profiling.iterate('match', results), owner, coverage, max_depth, rule_stats,
+                       output_format)
+    if revs:
+        _reject_options('--rev', [('--commits', commits is not None), ('--coverage', coverage is not None),
+                                  ('--rule-stats', rule_stats), ('--include-untracked', not only_tracked),
+                                  ('--no-recurse', not recurse)])
+        return _main_revisions(revs, paths, jobs, use_cache, owner, output_format)
+    if commits is not None:
+        _reject_options('--commits', [('--include-untracked', not only_tracked), ('--no-recurse', not recurse)])
 
     codeowners_path = fs_utils.codeowners_path(Path.cwd())
-    with open(codeowners_path, 'r') as codeowners_file:
-        rules = codeowners.parse_codeowners(codeowners_file, source_filename=codeowners_path)
+    with profiling.phase('parse'):
+        if use_cache:
+            rules = cache.load_rules(codeowners_path)
+        else:
+            with open(codeowners_path, 'r') as codeowners_file:
+                rules = codeowners.parse_codeowners(codeowners_file, source_filename=codeowners_path)
+    profiling.observe_rules(rules)
+
+    repo_root = fs_utils.git_repository_root(base_dir=Path.cwd())
+    click.echo('Repo root: {}'.format(repo_root), err=True)
+
+    if commits is not None:
+        changed_files = fs_utils.changed_files(commits, cwd=repo_root)
+        relative_paths = map(Path, filter(_path_filter(paths, repo_root), changed_files))
+    else:
+        paths = fs_utils.list_files(paths, untracked=not only_tracked, recursive=recurse)
+        relative_paths = (p.resolve().relative_to(repo_root) for p in paths)
+    relative_paths = profiling.iterate('list_files', relative_paths)
+
+    if owner is not None:
+        return _main_owner(rules, relative_paths, owner, output_format)
+
+    results = parallel.match_parallel(rules, relative_paths, jobs=jobs, is_dir=lambda p: (repo_root / p).is_dir())
+    return _report(rules, profiling.iterate('match', results), None, coverage, max_depth, rule_stats, output_format)
+
+
+def _reject_options(mode, options):
+    """ Raise a UsageError if any of ``options``, pairs of an option name and whether it was given, was given
+    with ``mode``, which does not support them.  """
+    given = [name for name, is_given in options if is_given]
+    if given:
+        raise click.UsageError('{} cannot be combined with {}.'.format(mode, ', '.join(given)))
+
+
+def _report(rules, results, owner, coverage, max_depth, rule_stats, output_format):
+    """ Write the pairs of a path and its MatchResult, or None, of ``results``, or only those owned by
+    ``owner``, or report their rule statistics or directory coverage.  """
+    from codeowners import report
+
+    if owner is not None:
+        file_count = itertools.count()
+        counted_results = (result for result, _ in zip(results, file_count))
+        owned_count = _write_results(((path, match_result) for path, match_result in counted_results
+                                      if match_result is not None and owner in match_result.owners), output_format)
+        _echo_owned_count(owner, owned_count, next(file_count), output_format)
+        return 0
+
+    if rule_stats:
+        for line in report.format_rule_stats(report.rule_stats(rules, results)):
+            click.echo(line)
+        return 0
+
+    if coverage is not None:
+        coverages = report.directory_coverage(results, max_depth=max_depth)
+        lines = report.format_json(coverages) if coverage == 'json' else report.format_table(coverages)
+        for line in lines:
+            click.echo(line)
+        return 0
+
+    _write_results(results, output_format)
+    return 0
+
+
+def _write_results(results, output_format):
+    # Text echoed so far must precede the buffered output.
+    sys.stdout.flush()
+    with profiling.phase('output'), output.BufferedOutput(sys.stdout.buffer) as stdout:
+        return output.write_results(results, output_format, stdout)
+
+
+def _main_owner(rules, paths, owner, output_format):
+    file_count = itertools.count()
+    counted_paths = (path for path, _ in zip(paths, file_count))
+
+    owned_count = _write_results(codeowners.owned_files(rules, counted_paths, owner), output_format)
+    # Consume any paths left unexamined, e.g. if no rule names the owner, so they are counted.
+    collections.deque(counted_paths, maxlen=0)
+    _echo_owned_count(owner, owned_count, next(file_count), output_format)
+
+    return 0
+
+
+def _echo_owned_count(owner, owned_count, file_count, output_format):
+    # Keep structured output parseable, by reporting the count on stderr.
+    click.echo('{}: {} of {} files'.format(owner, owned_count, file_count), err=output_format != 'text')
+
+
+def _path_filter(paths, repo_root):
+    """ Return a function telling whether a path relative to the repository root is at or below any of
+    ``paths``.  """
+    prefixes = [str(Path(p).resolve().relative_to(repo_root)) for p in paths]
+    return lambda path: any(prefix == '.' or path == prefix or path.startswith(prefix + '/') for prefix in prefixes)
+
+
+def _incremental_results(paths, use_cache):
+    """ Return the rules at HEAD, and the pairs of each committed file among ``paths`` and its MatchResult,
+    or None, from the snapshot of HEAD.  """
+    from codeowners import snapshots
+
+    repo_root = fs_utils.git_repository_root(base_dir=Path.cwd())
+    selected = _path_filter(paths, repo_root)
+
+    snapshot, rules = snapshots.revision_snapshot('HEAD', cwd=repo_root, use_cache=use_cache)
+    profiling.observe_rules(rules)
+    return rules, ((path, match_result) for path, match_result in snapshot.results(rules) if selected(path))
+
+
+def _main_revisions(revs, paths, jobs, use_cache, owner, output_format):
+    from codeowners import batch, cache, parallel
 
     repo_root = fs_utils.git_repository_root(base_dir=Path.cwd())
-    click.echo('Repo root: {}'.format(repo_root))
+    selected = _path_filter(paths, repo_root)
+    file_count, owned_count = 0, 0
 
-    for p in paths:
-        match_result = codeowners.match(rules, p.resolve().relative_to(repo_root), is_dir=p.is_dir())
-        click.echo(match_result.summary() if match_result else '{}: <NONE>'.format(p))
+    sys.stdout.flush()
+    with output.BufferedOutput(sys.stdout.buffer) as stdout, fs_utils.BlobReader(cwd=repo_root) as reader, \
+            parallel.MatchPool(jobs=jobs, use_cache=use_cache) as pool:
+        writer = output.ResultWriter(output_format, stdout, extra_fields=['rev'])
+        for rev in revs:
+            # Read the CODEOWNERS file and the files of the same commit, even if rev is a moving ref.
+            commit = fs_utils.rev_parse(rev + '^{commit}', cwd=repo_root)
+            with profiling.phase('parse'):
+                codeowners_location, content = fs_utils.read_codeowners(commit, reader)
+                text = content.decode('utf-8', 'surrogateescape')
+                source = batch.RepositoryRules(repo_root, cache.content_key(text, codeowners_location), text,
+                                               codeowners_location)
+                rules = pool.rules(source)
+            profiling.observe_rules(rules)
+
+            files = profiling.iterate('list_files', filter(selected, fs_utils.list_tree_files(commit, cwd=repo_root)))
+            results = profiling.iterate('match', pool.match(source, files))
+            with profiling.phase('output'):
+                for path, match_result in results:
+                    file_count += 1
+                    if owner is not None and (match_result is None or owner not in match_result.owners):
+                        continue
+                    owned_count += 1
+                    writer.write(path, match_result, [rev])
+        writer.close()
+
+    if owner is not None:
+        _echo_owned_count(owner, owned_count, file_count, output_format)
+    return 0
+
+
+def _read_rules(name, reader):
+    """ Return the rules of the CODEOWNERS file ``name``, or of the git object ``name``, such as
+    main:.github/CODEOWNERS.  """
+    if Path(name).is_file():
+        with open(name, 'r') as codeowners_file:
+            return codeowners.parse_codeowners(codeowners_file, source_filename=name)
+    content = reader.read(name)
+    if content is None:
+        raise click.BadParameter('{!r} is neither a file nor a git blob.'.format(name))
+    return codeowners.parse_codeowners(content.decode('utf-8', 'surrogateescape').splitlines(), source_filename=name)
+
+
+@main.command('diff-rules')
+@click.option('--rev', metavar='REV', help='Evaluate the files committed in REV, instead of the tracked files.')
+@click.option('--format', 'output_format', type=click.Choice(['text', 'jsonl']), default='text',
+              help='Format of the changes of owners of each file: text lines, or JSON lines.  Default: text.')
+@click.argument('old')
+@click.argument('new')
+@click.argument('paths', type=click.Path(), nargs=-1)
+def diff_rules(old, new, paths, rev, output_format):
+    """ List the files among PATHS whose owners differ between the CODEOWNERS files OLD and NEW.
+
+    OLD and NEW are files, or git objects such as main:.github/CODEOWNERS.  The rules added, removed or moved
+    are listed on stderr.  Only the files matched by those rules are evaluated.
+    """
+    from codeowners import impact
+
+    repo_root = fs_utils.git_repository_root(base_dir=Path.cwd())
+    with fs_utils.BlobReader(cwd=repo_root) as reader:
+        old_rules, new_rules = _read_rules(old, reader), _read_rules(new, reader)
+
+    for change in impact.rule_changes(old_rules, new_rules):
+        click.echo(change.summary(), err=True)
+
+    selected = _path_filter(paths or ('.',), repo_root)
+    if rev is not None:
+        files = fs_utils.list_tree_files(fs_utils.rev_parse(rev + '^{commit}', cwd=repo_root), cwd=repo_root)
+    else:
+        files = fs_utils.git_output_entries(['ls-files', '-z', '--cached'], cwd=repo_root)
+
+    change_count = 0
+    sys.stdout.flush()
+    with output.BufferedOutput(sys.stdout.buffer) as stdout:
+        for change in impact.ownership_changes(old_rules, new_rules, filter(selected, files)):
+            change_count += 1
+            stdout.write((change.summary() if output_format == 'text' else json.dumps(change.as_dict())) + '\n')
+    click.echo('{} files change owners'.format(change_count), err=True)
+    return 0
+
+
+@main.command('batch')
+@click.option('--repos-from', type=click.File('r'), metavar='FILE',
+              help='Read repository paths, one per line, from FILE, or from stdin if FILE is -, besides REPOS.')
+@click.option('--only-tracked/--include-untracked', is_flag=True, default=True,
+              help='Include only files tracked by git in output, or include untracked files.  '
+                   'Default: include only tracked files.')
+@click.option('--jobs', '-j', type=click.IntRange(min=0), default=0,
+              help='Number of worker processes, each matching one repository at a time; 0 uses one per CPU.  '
+                   'Default: 0.')
+@click.option('--cache/--no-cache', 'use_cache', is_flag=True, default=False,
+              help='Reuse parsed CODEOWNERS rules from the on-disk cache.  Loading rules from the cache is no faster '
+                   'than parsing them, so this only helps where reading the CODEOWNERS file is slow.  Default: does '
+                   'not use the cache.')
+@click.option('--format', 'output_format', type=click.Choice(output.FORMATS), default='text',
+              help='Format of the owners of each file, as for the list command.  Default: text.')
+@click.argument('repos', type=click.Path(), nargs=-1)
+def batch_owners(repos, repos_from, only_tracked, jobs, use_cache, output_format):
+    """ List the owners of the files of each of the repositories at REPOS.
+
+    Repositories are matched concurrently, and each result is prefixed by its repository path, as given.
+    Rules are parsed once for all the repositories with identical CODEOWNERS files.  Repositories that
+    cannot be read are reported on stderr, and the exit status is then 1.
+    """
+    from codeowners import batch
+
+    repo_paths = list(repos)
+    if repos_from is not None:
+        repo_paths.extend(line.strip() for line in repos_from if line.strip())
+
+    sys.stdout.flush()
+    failed = []
+
+    def on_error(repo_path, error):
+        failed.append(repo_path)
+        click.echo('{}: {}'.format(repo_path, error), err=True)
+
+    rules_cache = batch.RulesCache(use_cache)
+    results = batch.batch_match(repo_paths, jobs=jobs, use_cache=use_cache, untracked=not only_tracked,
+                                on_error=on_error, rules_cache=rules_cache)
+    with output.BufferedOutput(sys.stdout.buffer) as stdout:
+        writer = output.ResultWriter(output_format, stdout, extra_fields=['repo'])
+        for repo_path, path, match_result in results:
+            writer.write(path, match_result, [repo_path])
+        writer.close()
+
+    click.echo('{} repositories, {} distinct CODEOWNERS files, {} failed'.format(
+        len(repo_paths), len(rules_cache), len(failed)), err=True)
+    if failed:
+        sys.exit(1)
+    return 0
+
+
+@main.command()
+@click.option('--socket', 'socket_path', type=click.Path(), help='Path of the Unix domain socket to listen on.  '
+              'Default: codeowners.sock in the .git directory.')
+def serve(socket_path):
+    """ Serve ownership queries about this repository over a Unix domain socket.
+
+    Rules and the list of tracked files stay in memory, and are reloaded when the CODEOWNERS file or the
+    git index changes.
+    """
+    from codeowners import server
+
+    repo_root = fs_utils.git_repository_root(base_dir=Path.cwd())
+    socket_path = socket_path or server.default_socket_path(repo_root)
+    click.echo('Serving {} on {}'.format(repo_root, socket_path), err=True)
+    try:
+        server.serve(repo_root, socket_path)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+@main.command()
+@click.option('--socket', 'socket_path', type=click.Path(), help='Path of the Unix domain socket of the server.  '
+              'Default: codeowners.sock in the .git directory.')
+@click.option('--owner', metavar='OWNER', help='List the files owned by OWNER instead of matching PATHS.')
+@click.argument('paths', type=click.Path(), nargs=-1)
+def query(socket_path, owner, paths):
+    """ Query the owners of PATHS, or of paths read from stdin, from a running server.  """
+    from codeowners import server
+
+    repo_root = fs_utils.git_repository_root(base_dir=Path.cwd())
+    socket_path = socket_path or server.default_socket_path(repo_root)
+    with server.Client(socket_path) as client:
+        if owner is not None:
+            for path in client.owned_files(owner):
+                click.echo(path)
+            return 0
 
+        paths = paths or (line.rstrip('\n') for line in sys.stdin)
+        for result in client.match(Path(p).resolve().relative_to(repo_root) for p in paths):
+            owners = result['owners']
+            click.echo('{}: {}'.format(result['path'], ' '.join(owners) if owners is not None else '<NONE>'))
     return 0
 
 
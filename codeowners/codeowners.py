@@ -1,13 +1,17 @@
 """ Functions and classes for identifying code owners.
 
 """
+from array import array
+import bisect
 from collections import namedtuple
+import functools
 import itertools
-import fnmatch
+import heapq
 import logging
+import operator
+import os
 from pathlib import PurePath
 import re
-import shlex
 import typing
 
 
@@ -15,27 +19,45 @@ __all__ = []
 
 _logger = logging.getLogger(__file__)
 
+# Whether PurePath splits paths only at '/', so strings can be split without constructing a PurePath.
+_POSIX_PATHS = os.sep == '/' and os.altsep is None
+
 
 class Pattern:
+    __slots__ = ('pattern', 'dir_only', 'root_only', 'invert', '_parts', '_part_matchers', '_segments', '_match_impl')
+
     @classmethod
     def parse(cls, pattern: str):
         return parse_pattern(pattern)
 
     def __init__(self, pattern: PurePath, dir_only: bool, root_only: bool, invert: bool):
         self.pattern = pattern
-        self._regex_pattern = None
         self.dir_only = dir_only
         self.root_only = root_only
         self.invert = invert
-
-        if any(part == '**' for part in pattern.parts):
-            regex = self._prepare_recursive_pattern_as_regex(pattern)
-            self._regex_pattern = re.compile(regex)
-            self._match_impl = self._match_recursive
-        elif len(self.pattern.parts) == 1:
-            self._match_impl = self._match_any_part
+        self._parts = pattern.parts
+        # Compiled when the pattern is first evaluated, so rules that are never evaluated cost no compilation.
+        self._part_matchers = None
+        self._segments = None
+        self._match_impl = self._match_first
+
+    def _compile(self):
+        # Patterns may be shared by threads, so each attribute is assigned only once the state it depends on
+        # is in place: subtree_match uses _segments once _part_matchers is set, and _match_impl uses both.
+        part_matchers = tuple(compile_glob(part) for part in self._parts)
+        if self.recursive:
+            self._segments = _compile_segments(self._parts)
+            match_impl = self._match_recursive
+        elif len(self._parts) == 1 and not self.root_only:
+            match_impl = self._match_any_part
         else:
-            self._match_impl = self._match_leading
+            match_impl = self._match_leading
+        self._part_matchers = part_matchers
+        self._match_impl = match_impl
+
+    def _match_first(self, parts: typing.Sequence[str]):
+        self._compile()
+        return self._match_impl(parts)
 
     def __str__(self):
         notes = (['directory only'] if self.dir_only else []) + (['inverted'] if self.invert else [])
@@ -45,51 +67,276 @@ class Pattern:
         return '{cls}(pattern={pattern!r}, dir_only={dir_only!r}, invert={invert!r}'.format(
             cls=self.__class__.__name__, pattern=self.pattern, dir_only=self.dir_only, invert=self.invert)
 
-    def _prepare_recursive_pattern_as_regex(self, pattern):
-        regex_pattern_parts = []
-
-        # Add directory separators in or the regex won't properly match.
-        # The last can be a directory or file, either way it does not need a slash.
-        parts = [p + '/' for p in pattern.parts[:-1]] + [pattern.parts[-1]]
-        for pattern in parts:
-            # Because of the transformation above the recursive elements now have a slash.
-            if pattern == '**/':
-                regex_pattern_parts.append('(:?.*/)*')
-            elif pattern == '**':
-                # Not sure what to do with a regex that ends in recursion. Is this valid?
-                raise NotImplementedError("Recursion not understood.")
-            else:
-                regex = fnmatch.translate(pattern)
-                # Drop the "end of string" check from each component. Otherwise the
-                # match won't work when glued together.
-                if regex.endswith('\\Z'):
-                    regex = regex[0:-2]
-                regex_pattern_parts.append(regex)
+    def _match_leading(self, parts: typing.Sequence[str]):
+        return (len(parts) >= len(self._parts) and
+                all(part_matcher(path_part) for part_matcher, path_part in zip(self._part_matchers, parts)))
+
+    def _match_recursive(self, parts: typing.Sequence[str]):
+        # Each '**' component consumes zero or more whole path components, except a final '**', which
+        # consumes at least one.  Placing every segment between '**' components at its earliest match leaves
+        # the most components for the segments after it, so a greedy scan decides the match in at most
+        # len(parts) * len(self._parts) component comparisons, without backtracking across '**' components.
+        # Each segment is found by a regex search, whose matches start and end at component boundaries.
+        segments = self._segments
+        path = '/'.join(parts)
+        # The offset in path of the component after the segments matched so far.
+        start = 0
+        if segments[0] is not None:
+            m = segments[0].match(path)
+            if m is None:
+                return False
+            start = m.end() + 1
+        for k in range(1, len(segments)):
+            if segments[k] is not None:
+                m = segments[k].search(path, start)
+                if m is None:
+                    return False
+                start = m.end() + 1
+        # Like the other match implementations, the pattern matches a leading sequence of path components,
+        # so the contents of a matching directory match as well.
+        return start < len(path) if self._parts[-1] == '**' else True
+
+    def _match_any_part(self, parts: typing.Sequence[str]):
+        assert len(self._parts) == 1
+        return any(map(self._part_matchers[0], parts))
+
+    def literal_prefix(self) -> typing.Optional[typing.Tuple[str, ...]]:
+        """ Return the leading components, free of wildcards, that any matching path must start with.
+
+        Return None for unanchored patterns, which may match at any depth, and for inverted patterns.
+        """
+        parts = self.pattern.parts
+        if self.invert or (len(parts) == 1 and not self.root_only):
+            return None
+        return tuple(itertools.takewhile(is_literal_glob, parts))
+
+    def subtree_match(self, dir_parts: typing.Sequence[str]) -> typing.Optional[bool]:
+        """ Return whether the pattern matches files below the directory with the given path components.
+
+        Return True if it matches every file at any depth below the directory, False if it matches none of
+        them, and None if the result depends on the rest of the path.
+        """
+        if self.dir_only:
+            # Directory-only patterns never match files.
+            return self.invert
+
+        if self._part_matchers is None:
+            self._compile()
+        parts, part_matchers = self._parts, self._part_matchers
+        if self.recursive:
+            result = _match_leading_parts(part_matchers[:parts.index('**')], dir_parts)
+            if result is not False and (parts.count('**') > 1 or parts[-1] != '**'):
+                # Only a pattern ending in its only '**' matches every file below its leading segment.
+                result = None
+        elif len(parts) == 1 and not self.root_only:
+            matches_any_name = parts[0].strip('*') == ''
+            result = True if matches_any_name or any(map(part_matchers[0], dir_parts)) else None
+        else:
+            result = _match_leading_parts(part_matchers, dir_parts)
+            if result is None and len(parts) == len(dir_parts) + 1 and parts[-1].strip('*') == '':
+                # Every file below the directory has a component in the position of the final wildcard.
+                result = _match_leading_parts(part_matchers[:-1], dir_parts)
+
+        if result is None:
+            return None
+        return (not result) if self.invert else result
+
+    @property
+    def recursive(self) -> bool:
+        """ Whether the pattern contains a '**' component.  """
+        return '**' in self._parts
+
+    def as_regex(self, is_dir=False) -> typing.Optional[str]:
+        """ Return regular expression source that fully matches a path, given as its components joined by
+        '/', exactly when ``match(path, is_dir=is_dir)`` is true.  Return None if no path can match.
+
+        Recursive patterns are not translated, since regexes of several '**' components backtrack
+        catastrophically on deep paths:  raises ValueError for them.
+        """
+        if self.recursive:
+            raise ValueError('Recursive pattern cannot be translated to a regex: {!r}'.format(str(self.pattern)))
+        parts = self.pattern.parts
+        leading = '/'.join(translate_glob(part) for part in parts) + '(?:/.*)?'
+        if len(parts) == 1 and not self.root_only:
+            regex = '(?:.*/)?' + leading
+        else:
+            regex = leading
 
-        return ''.join(regex_pattern_parts)
+        if self.dir_only and not is_dir:
+            regex = None
 
-    def _match_leading(self, path: PurePath):
-        return all(path_part is not None and fnmatch.fnmatch(path_part, pat_part)
-                   for pat_part, path_part in zip(self.pattern.parts,
-                                                  itertools.chain(path.parts, itertools.repeat(None))))
+        if self.invert:
+            return '.*' if regex is None else '(?!(?:{})\\Z).*'.format(regex)
+        return regex
+
+    def match(self, path: typing.Union[PurePath, str], is_dir=False):
+        return self.match_parts(split_path(path), is_dir=is_dir)
 
-    def _match_recursive(self, path: PurePath):
-        return self._regex_pattern.match(str(path)) is not None
+    def match_parts(self, parts: typing.Sequence[str], is_dir=False) -> bool:
+        """ Match a path given as its components, as returned by ``split_path``.  """
+        match_result = (is_dir or not self.dir_only) and self._match_impl(parts)
+        return (not match_result) if self.invert else match_result
 
-    def _match_any_part(self, path: PurePath):
-        assert len(self.pattern.parts) == 1
-        pattern_part = self.pattern.parts[0]
-        return any(fnmatch.fnmatch(part, pattern_part) for part in path.parts)
 
-    def match(self, path: typing.Union[PurePath, str], is_dir=False):
-        path = PurePath(path)
+def split_path(path: typing.Union[PurePath, str]) -> typing.Tuple[str, ...]:
+    """ Return the components of a path, equal to ``PurePath(path).parts``.  """
+    if isinstance(path, str) and _POSIX_PATHS and not path.startswith('/'):
+        parts = path.split('/')
+        if '' in parts or '.' in parts:
+            return tuple(part for part in parts if part and part != '.')
+        return tuple(parts)
+    if isinstance(path, PurePath):
+        return path.parts
+    return PurePath(path).parts
+
+
+# Numbers of the groups of translated globs, unique so that translations can be joined into one regex.
+_next_group_number = itertools.count().__next__
+
+
+def translate_glob(pattern: str) -> str:
+    """ Translate a glob for a single path component into regular expression source.
+
+    Unlike ``fnmatch.translate``, wildcards never match the '/' separator, so the translated components can
+    be joined into a regex over a whole path.  As in ``fnmatch.translate``, the text between two '*' is
+    matched at its earliest position, without backtracking, so matching takes time linear in the length of
+    the component.
+    """
+    star = object()
+    i, n = 0, len(pattern)
+    res = []
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c == '*':
+            if not res or res[-1] is not star:
+                res.append(star)
+        elif c == '?':
+            res.append('[^/]')
+        elif c == '[':
+            j = i
+            if j < n and pattern[j] == '!':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j >= n:
+                res.append('\\[')
+            else:
+                res.append(_translate_set(pattern, i, j))
+                i = j + 1
+        else:
+            res.append(re.escape(c))
+
+    # The tokens before the first '*' are matched as they are.
+    k = next((k for k, token in enumerate(res) if token is star), len(res))
+    translated = res[:k]
+    while k < len(res):
+        # Each '*' is followed by fixed tokens, up to the next '*' or the end.
+        end = next((end for end in range(k + 1, len(res)) if res[end] is star), len(res))
+        fixed = ''.join(res[k + 1:end])
+        if end == len(res):
+            translated.append('[^/]*' + fixed)
+        else:
+            # A lookahead, which never backtracks once it matches, finds the earliest match of the fixed tokens,
+            # and a backreference consumes it, in place of an atomic group.
+            group = 'g{}'.format(_next_group_number())
+            translated.append('(?=(?P<{group}>[^/]*?{fixed}))(?P={group})'.format(group=group, fixed=fixed))
+        k = end
+    return ''.join(translated)
+
+
+def _translate_set(pattern: str, i: int, j: int) -> str:
+    """ Translate the set ``pattern[i:j]``, the contents of a bracket expression, into regular expression source
+    matching a single character other than '/', as ``fnmatch.translate`` does.  """
+    if '-' not in pattern[i:j]:
+        stuff = pattern[i:j].replace('\\', '\\\\')
+    else:
+        # Split the set at the hyphens of its ranges, to remove empty ranges, which are invalid in a regex.
+        chunks = []
+        k = i + 2 if pattern[i] == '!' else i + 1
+        while True:
+            k = pattern.find('-', k, j)
+            if k < 0:
+                break
+            chunks.append(pattern[i:k])
+            i = k + 1
+            k = k + 3
+        chunk = pattern[i:j]
+        if chunk:
+            chunks.append(chunk)
+        else:
+            chunks[-1] += '-'
+        for k in range(len(chunks) - 1, 0, -1):
+            if chunks[k - 1][-1] > chunks[k][0]:
+                chunks[k - 1] = chunks[k - 1][:-1] + chunks[k][1:]
+                del chunks[k]
+        # Escape backslashes, and hyphens other than those of ranges, which could form set differences.
+        stuff = '-'.join(chunk.replace('\\', '\\\\').replace('-', '\\-') for chunk in chunks)
+    # Escape the characters of set operations, such as '&&', which the re module may support in the future.
+    stuff = re.sub(r'([&~|])', r'\\\1', stuff)
+
+    if not stuff:
+        # An empty set matches nothing.
+        return '(?!)'
+    if stuff == '!':
+        # An empty negated set matches any character.
+        return '[^/]'
+    if stuff[0] == '!':
+        stuff = '^' + stuff[1:]
+    elif stuff[0] in ('^', '['):
+        stuff = '\\' + stuff
+    return '(?!/)[{}]'.format(stuff)
+
+
+def compile_glob(pattern: str) -> typing.Callable[[str], bool]:
+    """ Return a function matching a single path component against a glob, specialized by the form of the glob.
+
+    Literals are compared for equality, and ``*suffix`` and ``prefix*`` globs are matched with ``endswith``
+    and ``startswith``.  Other globs are compiled to a dedicated regex, so ``fnmatch``'s cache of compiled
+    patterns is never involved.  The returned functions can be pickled, and return a truthy value on a match.
+    """
+    if is_literal_glob(pattern):
+        return pattern.__eq__
+
+    body = pattern.strip('*')
+    if body == '':
+        # Path components are never empty, so every component matches.
+        return bool
+    if is_literal_glob(body):
+        if pattern == '*' + body:
+            return operator.methodcaller('endswith', body)
+        if pattern == body + '*':
+            return operator.methodcaller('startswith', body)
+
+    return re.compile(translate_glob(pattern), re.DOTALL).fullmatch
+
+
+def _match_leading_parts(part_matchers: typing.Sequence[typing.Callable[[str], bool]],
+                         dir_parts: typing.Sequence[str]) -> typing.Optional[bool]:
+    """ Return whether paths below ``dir_parts`` match leading components, or None if undecided.  """
+    if not all(part_matcher(dir_part) for part_matcher, dir_part in zip(part_matchers, dir_parts)):
+        return False
+    return True if len(dir_parts) >= len(part_matchers) else None
+
+
+def _compile_segments(parts: typing.Sequence[str]) -> typing.List[typing.Optional[typing.Pattern]]:
+    """ Return a regex for each segment of a recursive pattern between its '**' components, or None for empty
+    segments.  The regexes match whole components of a path whose components are joined by '/'.  """
+    segments = [[]]
+    for part in parts:
+        if part == '**':
+            segments.append([])
+        else:
+            segments[-1].append(translate_glob(part))
+    return [re.compile('(?<![^/]){}(?![^/])'.format('/'.join(segment)), re.DOTALL) if segment else None
+            for segment in segments]
 
-        match_result = self._match_impl(path)
-        is_root_match = self._match_leading(path)
 
-        match_result &= (is_dir or not self.dir_only)
-        match_result &= (is_root_match or not self.root_only)
-        return (not match_result) if self.invert else match_result
+def is_literal_glob(pattern: str) -> bool:
+    """ Return whether the glob pattern contains no wildcards, and so only matches itself.  """
+    return not any(c in pattern for c in '*?[')
 
 
 def is_rule(line: str) -> bool:
@@ -104,18 +351,21 @@ def parse_pattern(pattern: str) -> Pattern:
 
     dir_only, root_only, invert = False, False, False
 
-    if pattern[0] == '!':
+    if pattern.startswith('!'):
         invert = True
         pattern = pattern[1:]
 
-    if pattern[-1] == '/':
+    if pattern.endswith('/'):
         dir_only = True
         pattern = pattern[:-1]
 
-    if pattern[0] == '/':
+    if pattern.startswith('/'):
         root_only = True
         pattern = pattern[1:]
 
+    if not pattern:
+        raise ValueError('Pattern matches no path')
+
     path = PurePath(pattern)
     for part in path.parts:
         if '**' in part and part != '**':
@@ -125,27 +375,587 @@ def parse_pattern(pattern: str) -> Pattern:
 
 
 class MatchResult(namedtuple('MatchResultData', 'path, owners, source_line, source_filename, source_lineno')):
+    __slots__ = ()
+
     def summary(self) -> str:
         return '{path}: {owners}'.format(path=self.path, owners=' '.join(self.owners))
 
 
 class Rule(namedtuple('RuleData', 'pattern, owners, source_line, source_filename, source_lineno')):
+    __slots__ = ()
+
+    def result(self, path) -> MatchResult:
+        """ Return a MatchResult attributing ownership of ``path`` to this rule.  """
+        # Owners are shared between rules, so each result gets its own list of them.
+        return MatchResult(path=path, owners=list(self.owners), source_line=self.source_line,
+                           source_filename=self.source_filename, source_lineno=self.source_lineno)
+
     def match(self, path, is_dir=False) -> typing.Optional[MatchResult]:
-        return (MatchResult(path=path, owners=self.owners, source_line=self.source_line,
-                            source_filename=self.source_filename, source_lineno=self.source_lineno)
-                if self.pattern.match(path, is_dir=is_dir) else None)
+        return self.result(path) if self.pattern.match(path, is_dir=is_dir) else None
+
+
+class ParseError(ValueError):
+    """ An invalid line of a CODEOWNERS file, with the 1-based line and column numbers of the error.  """
+
+    def __init__(self, message: str, source_filename, lineno: int, column: int):
+        super().__init__('{}:{}:{}: {}'.format(source_filename, lineno, column, message))
+        self.message = message
+        self.source_filename = source_filename
+        self.lineno = lineno
+        self.column = column
+
+
+def tokenize_line(line: str, source_filename='<line>', lineno: int = 1) -> typing.List[str]:
+    """ Return the whitespace-separated tokens of a CODEOWNERS line:  its pattern and owners, if any.
+
+    A backslash escapes the next character, such as a space or '#', which becomes part of the token.  A
+    '#' at the start of a token starts a comment, which extends to the end of the line.  Quotes have no
+    special meaning.  Raises ParseError for a backslash at the end of the line.
+    """
+    if '\\' not in line and '#' not in line:
+        return line.split()
+
+    # Lines read from files keep their terminator, which a backslash must not escape.
+    line = line.rstrip('\r\n')
+    tokens = []
+    token = None
+    i, end = 0, len(line)
+    while i < end:
+        c = line[i]
+        if c == '\\':
+            if i + 1 == end:
+                raise ParseError('Backslash at end of line', source_filename, lineno, i + 1)
+            token = (token or '') + line[i + 1]
+            i += 2
+            continue
+        if c.isspace():
+            if token is not None:
+                tokens.append(token)
+                token = None
+        elif c == '#' and token is None:
+            break
+        else:
+            token = (token or '') + c
+        i += 1
+    if token is not None:
+        tokens.append(token)
+    return tokens
 
 
 def parse_codeowners(lines: typing.Iterable[str], source_filename: str) -> typing.List[Rule]:
-    def parse_line(line, source_lineno):
-        pattern, *owners = shlex.split(line)  # Handle escaped spaces.
+    """ Return the rules of the lines of a CODEOWNERS file, the last, which has the highest priority, first.
+
+    Patterns are compiled when first evaluated.  Owners are tuples, shared by all rules with the same owners.
+    Raises ParseError for invalid lines.
+    """
+    owner_tuples = {}
+    rules = []
+    for source_lineno, line in enumerate(lines, start=1):
+        tokens = tokenize_line(line, source_filename, source_lineno)
+        if not tokens:
+            continue
+        pattern, *owners = tokens
+        try:
+            pattern = parse_pattern(pattern)
+        except ValueError as e:
+            column = len(line) - len(line.lstrip()) + 1
+            raise ParseError('Invalid pattern: {}'.format(e), source_filename, source_lineno, column) from None
+        rules.append(Rule(pattern=pattern, owners=owner_tuples.setdefault(tuple(owners), tuple(owners)),
+                          source_filename=source_filename, source_lineno=source_lineno, source_line=line))
+    return rules[::-1]
 
-        return Rule(pattern=parse_pattern(pattern), owners=owners,
-                    source_filename=source_filename, source_lineno=source_lineno, source_line=line)
 
-    return [parse_line(line, i) for i, line in enumerate(lines, start=1) if is_rule(line)][::-1]
+def match(rules, path, is_dir=False) -> typing.Optional[MatchResult]:
+    parts = split_path(path)
+    return next((rule.result(path) for rule in rules if rule.pattern.match_parts(parts, is_dir=is_dir)), None)
+
+
+class CompiledRuleSet:
+    """ Rules, as returned by ``parse_codeowners``, compiled into one combined regular expression.
+
+    The rules become alternatives of the combined regex, in order, so the first alternative that matches
+    identifies the same winning rule as ``match``, in a single pass of the regex engine.  A separate regex
+    is compiled, on first use, for directories and for files.  Recursive rules are left out of the regex,
+    and only those of higher priority than the regex's winner are evaluated separately, if the path
+    contains a literal component of their pattern.
+    """
+
+    def __init__(self, rules: typing.Iterable[Rule]):
+        self.rules = list(rules)
+        self._regexes = {}
+        # Recursive rules keyed by a literal component that matching paths must contain, as in RuleIndex.
+        self._recursive_by_component = {}
+        self._recursive_unindexed = []
+        for i, rule in enumerate(self.rules):
+            pattern = rule.pattern
+            if not pattern.recursive:
+                continue
+            literal_part = next((part for part in pattern.pattern.parts if is_literal_glob(part)), None)
+            if literal_part is not None and not pattern.invert:
+                self._recursive_by_component.setdefault(literal_part, []).append(i)
+            else:
+                self._recursive_unindexed.append(i)
+
+    def _recursive_candidates(self, parts: typing.Sequence[str]) -> typing.List[int]:
+        by_component = self._recursive_by_component
+        candidates = list(self._recursive_unindexed)
+        if by_component:
+            for part in set(parts):
+                candidates.extend(by_component.get(part, ()))
+            candidates.sort()
+        return candidates
+
+    def _combined_regex(self, is_dir: bool):
+        if is_dir not in self._regexes:
+            alternatives = []
+            for i, rule in enumerate(self.rules):
+                if rule.pattern.recursive:
+                    continue
+                regex = rule.pattern.as_regex(is_dir=is_dir)
+                if regex is not None:
+                    alternatives.append('(?P<r{}>{})'.format(i, regex))
+            combined = re.compile('|'.join(alternatives), re.DOTALL) if alternatives else None
+            # Translated globs have groups of their own, so the group of each alternative, the last to close
+            # when it matches, is found by its name.
+            rule_indices = {combined.groupindex[name]: int(name[1:]) for name in combined.groupindex
+                            if name.startswith('r')} if combined is not None else {}
+            self._regexes[is_dir] = (combined, rule_indices)
+        return self._regexes[is_dir]
+
+    def match_index(self, path, is_dir=False) -> typing.Optional[int]:
+        """ Return the index within ``rules`` of the rule that matches ``path``, or None.  """
+        parts = split_path(path)
+        if not parts:
+            # The combined regex requires at least one path component.
+            return next((i for i, rule in enumerate(self.rules) if rule.pattern.match_parts(parts, is_dir=is_dir)),
+                        None)
+
+        regex, rule_indices = self._combined_regex(bool(is_dir))
+        m = regex.fullmatch('/'.join(parts)) if regex is not None else None
+        index = rule_indices[m.lastindex] if m is not None else None
+        for i in self._recursive_candidates(parts):
+            if index is not None and i > index:
+                break
+            if self.rules[i].pattern.match_parts(parts, is_dir=is_dir):
+                return i
+        return index
 
+    def match(self, path, is_dir=False) -> typing.Optional[MatchResult]:
+        index = self.match_index(path, is_dir=is_dir)
+        return self.rules[index].result(path) if index is not None else None
+
+
+class RuleIndex:
+    """ Rules, as returned by ``parse_codeowners``, indexed by the literal prefixes of their patterns.
+
+    Anchored rules are stored in a trie keyed on the literal leading components of their patterns, and
+    unanchored rules whose pattern is a single literal component are keyed on that component.  A lookup
+    only evaluates the rules found along the path's components, plus the remaining rules that can match at
+    any location, so its cost depends on the path depth rather than on the number of rules.
+    """
+
+    def __init__(self, rules: typing.Iterable[Rule]):
+        self.rules = list(rules)
+        # Each trie node is a pair: (child nodes keyed by path component, indices of rules ending here).
+        self._trie = ({}, [])
+        self._by_component = {}
+        self._unindexed = []
+
+        for i, rule in enumerate(self.rules):
+            pattern = rule.pattern
+            prefix = pattern.literal_prefix()
+            if prefix:
+                node = self._trie
+                for part in prefix:
+                    node = node[0].setdefault(part, ({}, []))
+                node[1].append(i)
+            elif prefix is None and not pattern.invert and is_literal_glob(pattern.pattern.parts[0]):
+                self._by_component.setdefault(pattern.pattern.parts[0], []).append(i)
+            else:
+                self._unindexed.append(i)
+
+    def candidates(self, path) -> typing.Iterator[int]:
+        """ Return indices of the rules that could match ``path``, in increasing order.  """
+        return self._candidates(split_path(path))
+
+    def _candidates(self, parts):
+        candidate_lists = [self._unindexed]
+        node = self._trie
+        for part in parts:
+            node = node[0].get(part)
+            if node is None:
+                break
+            candidate_lists.append(node[1])
+        candidate_lists.extend(self._by_component[part] for part in set(parts) if part in self._by_component)
+        return heapq.merge(*candidate_lists)
+
+    def match_index(self, path, is_dir=False) -> typing.Optional[int]:
+        """ Return the index within ``rules`` of the rule that matches ``path``, or None.  """
+        parts = split_path(path)
+        return next((i for i in self._candidates(parts) if self.rules[i].pattern.match_parts(parts, is_dir=is_dir)),
+                    None)
 
-def match(rules, path, is_dir=False) -> typing.Optional[MatchResult]:
-    return next(filter(lambda res: res is not None, (rule.match(path, is_dir=is_dir) for rule in rules)),
-                None)
+    def match(self, path, is_dir=False) -> typing.Optional[MatchResult]:
+        index = self.match_index(path, is_dir=is_dir)
+        return self.rules[index].result(path) if index is not None else None
+
+
+class _RuleClasses:
+    """ The rules of a ScopedMatcher, classified by how their results for files vary from directory to directory.
+
+    Patterns of a single component, such as ``*.py``, match a file if they match any of its components, so
+    they are matched once against each directory name and each file name, by a CompiledRuleSet of all of
+    them.  Recursive patterns starting with '**' may match below any directory, so, as in CompiledRuleSet,
+    they are evaluated only for paths containing a literal component of their pattern.  Only the other rules
+    are narrowed from each directory to its subdirectories.  Rules whose pattern repeats the pattern of a rule
+    of higher priority never decide ownership, and are left out.
+    """
+
+    def __init__(self, rules: typing.Sequence[Rule]):
+        self.rules = rules
+        self.shadowed = set()
+        names, recursive = [], []
+        self.recursive_by_component = {}
+        self.recursive_unindexed = []
+        # Literal leading components of the narrowed rules, or None for those that are not anchored.
+        self.literal_prefixes = {}
+        seen = set()
+        for i, rule in enumerate(rules):
+            pattern = rule.pattern
+            key = (pattern.pattern, pattern.dir_only, pattern.root_only, pattern.invert)
+            if key in seen:
+                self.shadowed.add(i)
+                continue
+            seen.add(key)
+            parts = pattern.pattern.parts
+            if pattern.invert or pattern.dir_only:
+                self.literal_prefixes[i] = pattern.literal_prefix()
+            elif len(parts) == 1 and not pattern.root_only and not pattern.recursive:
+                names.append(i)
+            elif parts[0] == '**' and len(parts) > 1:
+                recursive.append(i)
+                literal_part = next((part for part in parts if is_literal_glob(part)), None)
+                if literal_part is not None:
+                    self.recursive_by_component.setdefault(literal_part, []).append(i)
+                else:
+                    self.recursive_unindexed.append(i)
+            else:
+                self.literal_prefixes[i] = pattern.literal_prefix()
+        # Rules that are never narrowed, whose results depend on the rest of the path below any directory.
+        self.unscoped = sorted(names + recursive)
+
+        compiled_names = CompiledRuleSet(rules[i] for i in names)
+
+        def name_index(name):
+            index = compiled_names.match_index(name)
+            return names[index] if index is not None else None
+
+        # Names of files and directories recur throughout a repository.
+        self.name_index = functools.lru_cache(maxsize=4096)(name_index)
+
+
+class DirectoryScope:
+    """ Rules that decide ownership of the files below a directory.
+
+    ``candidates`` holds the indices of the rules whose result depends on the rest of the path, in priority
+    order.  If none of them match, ``fallback``, the index of a rule that matches every file below the
+    directory, or None, decides ownership.
+    """
+    __slots__ = ('dir_parts', 'fallback', '_classes', '_narrowed', '_active', '_file_candidates', '_children')
+
+    def __init__(self, classes: _RuleClasses, dir_parts: typing.Tuple[str, ...], fallback: typing.Optional[int],
+                 narrowed: typing.List[int], active: typing.List[int]):
+        self.dir_parts = dir_parts
+        self.fallback = fallback
+        self._classes = classes
+        # Narrowed rules whose result depends on the rest of the path, and recursive rules of a literal
+        # component of the directory's path, or of none, all evaluated for each file.
+        self._narrowed = narrowed
+        self._active = active
+        self._file_candidates = sorted(narrowed + active)
+        # The narrowed rules keyed by their literal component at the depth of the subdirectories, created for
+        # the first subdirectory.
+        self._children = None
+
+    @property
+    def candidates(self) -> typing.List[int]:
+        unscoped = self._classes.unscoped
+        end = bisect.bisect_left(unscoped, self.fallback) if self.fallback is not None else len(unscoped)
+        return sorted(self._narrowed + unscoped[:end])
+
+    @property
+    def fixed(self) -> bool:
+        """ Whether ``fallback`` alone decides ownership of every file at any depth below the directory.  """
+        unscoped = self._classes.unscoped
+        return not self._narrowed and (not unscoped or (self.fallback is not None and unscoped[0] > self.fallback))
+
+    @classmethod
+    def root(cls, rules: typing.Sequence[Rule]) -> 'DirectoryScope':
+        """ Return the scope of the repository root.  """
+        classes = _RuleClasses(list(rules))
+        narrowed, fallback = [], None
+        for i in sorted(classes.literal_prefixes.keys() | classes.unscoped):
+            subtree_match = classes.rules[i].pattern.subtree_match(())
+            if subtree_match is None:
+                if i in classes.literal_prefixes:
+                    narrowed.append(i)
+            elif subtree_match:
+                fallback = i
+                break
+        return cls(classes, (), fallback, narrowed, classes.recursive_unindexed)
+
+    def child(self, rules: typing.Sequence[Rule], name: str) -> 'DirectoryScope':
+        """ Return the scope of the subdirectory ``name``, narrowed from this scope.  """
+        classes = self._classes
+        dir_parts = self.dir_parts + (name,)
+        fallback = self.fallback
+        name_index = classes.name_index(name)
+        if name_index is not None and (fallback is None or name_index < fallback):
+            fallback = name_index
+
+        narrowed = []
+        for i in self._child_candidates(name):
+            if fallback is not None and i >= fallback:
+                break
+            subtree_match = classes.rules[i].pattern.subtree_match(dir_parts)
+            if subtree_match is None:
+                narrowed.append(i)
+            elif subtree_match:
+                fallback = i
+                break
+
+        active = self._active
+        activated = classes.recursive_by_component.get(name)
+        if activated is not None and name not in self.dir_parts:
+            active = sorted(active + activated)
+        return DirectoryScope(classes, dir_parts, fallback, narrowed, active)
+
+    def _child_candidates(self, name: str) -> typing.List[int]:
+        """ Return the narrowed rules that may match below the subdirectory ``name``, in priority order.  """
+        if self._children is None:
+            depth = len(self.dir_parts)
+            by_name, others = {}, []
+            for i in self._narrowed:
+                prefix = self._classes.literal_prefixes[i]
+                if prefix is not None and len(prefix) > depth:
+                    by_name.setdefault(prefix[depth], []).append(i)
+                else:
+                    others.append(i)
+            self._children = (by_name, others)
+        by_name, others = self._children
+        named = by_name.get(name)
+        return sorted(named + others) if named else others
+
+    def file_index(self, parts: typing.Sequence[str]) -> typing.Optional[int]:
+        """ Return the index of the rule that matches the file in this directory with the given path components,
+        or None.  """
+        classes = self._classes
+        rules = classes.rules
+        index = self.fallback
+        name_index = classes.name_index(parts[-1])
+        if name_index is not None and (index is None or name_index < index):
+            index = name_index
+        for candidates in (self._file_candidates, classes.recursive_by_component.get(parts[-1], ())):
+            for i in candidates:
+                if index is not None and i >= index:
+                    break
+                if rules[i].pattern.match_parts(parts):
+                    index = i
+                    break
+        return index
+
+
+class ScopedMatcher:
+    """ Matches files against rules, memoizing the rules that remain relevant below each directory.
+
+    The scopes of the directories enclosing the previous path are kept as a stack, so consecutive paths in
+    the same directory tree, as in the sorted output of ``git ls-files``, share the work of discarding rules
+    that cannot match.  Memory is bounded by the depth of the tree.  Directories are matched against all
+    rules, since the scopes only account for files.
+    """
+
+    def __init__(self, rules: typing.Iterable[Rule]):
+        self.rules = list(rules)
+        self._stack = [DirectoryScope.root(self.rules)]
+
+    def scope(self, dir_parts: typing.Sequence[str]) -> DirectoryScope:
+        """ Return the scope of the directory with the given path components.  """
+        stack = self._stack
+        # stack[k] is the scope of the directory with components dir_parts[:k].
+        depth = 1
+        while depth < min(len(stack), len(dir_parts) + 1) and stack[depth].dir_parts[-1] == dir_parts[depth - 1]:
+            depth += 1
+        del stack[depth:]
+        for name in dir_parts[depth - 1:]:
+            stack.append(stack[-1].child(self.rules, name))
+        return stack[-1]
+
+    def fixed_scope(self, dir_parts: typing.Sequence[str]) -> typing.Optional[DirectoryScope]:
+        """ Return the scope of the outermost directory, among the directory with the given path components
+        and its parents, whose files all have fixed ownership, or None if ownership of the directory's files
+        depends on their paths.  """
+        if not self.scope(dir_parts).fixed:
+            return None
+        # Scopes only narrow from parent to child, so every scope below a fixed scope is fixed too.
+        return next(scope for scope in self._stack if scope.fixed)
+
+    def match_index(self, path, is_dir=False) -> typing.Optional[int]:
+        """ Return the index within ``rules`` of the rule that matches ``path``, or None.  """
+        return self._match_parts_index(split_path(path), is_dir)
+
+    def _match_parts_index(self, parts, is_dir):
+        if is_dir:
+            return next((i for i, rule in enumerate(self.rules) if rule.pattern.match_parts(parts, is_dir=True)), None)
+
+        return self.scope(parts[:-1]).file_index(parts)
+
+    def match_indices(self, items: typing.Iterable[typing.Tuple[typing.Any, bool]]
+                      ) -> typing.Iterator[typing.Tuple[typing.Any, typing.Optional[int]]]:
+        """ Generate a pair of each path and the index of the rule that matches it, or None, from pairs of a
+        path and whether it is a directory.
+
+        Once a file falls in a subtree whose ownership is fixed, the following files of the subtree are
+        recognized by the prefix of their path, so the files of a subtree that is consecutive in the sorted
+        output of ``git ls-files`` are assigned without being split or matched.  ``PurePath`` paths are
+        recognized by their leading components, which they split only once.
+        """
+        fixed_parts, fixed_prefix, fixed_index = None, None, None
+        for path, is_dir in items:
+            if is_dir:
+                yield path, self._match_parts_index(split_path(path), is_dir=True)
+            elif fixed_parts is not None and (
+                    path.startswith(fixed_prefix) if isinstance(path, str) and fixed_prefix is not None else
+                    isinstance(path, PurePath) and path.parts[:len(fixed_parts)] == fixed_parts and
+                    len(path.parts) > len(fixed_parts)):
+                yield path, fixed_index
+            else:
+                parts = split_path(path)
+                scope = self.scope(parts[:-1])
+                if scope.fixed:
+                    # Scopes only narrow from parent to child, so every scope below a fixed scope is fixed too.
+                    fixed = next(outer for outer in self._stack if outer.fixed)
+                    fixed_parts = fixed.dir_parts
+                    # Strings are compared by prefix only if they are split at '/' alone.
+                    fixed_prefix = ''.join(part + '/' for part in fixed_parts) if _POSIX_PATHS else None
+                    fixed_index = fixed.fallback
+                    yield path, fixed_index
+                else:
+                    fixed_parts = None
+                    yield path, scope.file_index(parts)
+
+    def match(self, path, is_dir=False) -> typing.Optional[MatchResult]:
+        index = self.match_index(path, is_dir=is_dir)
+        return self.rules[index].result(path) if index is not None else None
+
+
+def owner_index(rules: typing.Iterable[Rule]) -> typing.Dict[str, typing.List[int]]:
+    """ Return a mapping of each owner to the indices of the rules naming it, in increasing order.  """
+    index = {}
+    for i, rule in enumerate(rules):
+        for owner in rule.owners:
+            rule_indices = index.setdefault(owner, [])
+            if not rule_indices or rule_indices[-1] != i:
+                rule_indices.append(i)
+    return index
+
+
+def owned_files(rules: typing.Iterable[Rule], paths: typing.Iterable, owner: str
+                ) -> typing.Iterator[typing.Tuple[typing.Any, MatchResult]]:
+    """ Generate a pair of each file among ``paths`` owned by ``owner`` and its MatchResult.
+
+    Rules of lower priority than every rule naming the owner are never evaluated, and neither are the rules
+    for the files of directories where no rule naming the owner can match.
+    """
+    rules = list(rules)
+    owner_rules = owner_index(rules).get(owner)
+    if not owner_rules:
+        return
+
+    # If no rule up to the last one naming the owner matches, the owner does not own the file.
+    rules = rules[:owner_rules[-1] + 1]
+    owner_rules = frozenset(owner_rules)
+    matcher = ScopedMatcher(rules)
+    for path in paths:
+        parts = split_path(path)
+        scope = matcher.scope(parts[:-1])
+        if scope.fallback not in owner_rules and owner_rules.isdisjoint(scope.candidates):
+            continue
+        index = next((i for i in scope.candidates if rules[i].pattern.match_parts(parts)), scope.fallback)
+        if index in owner_rules:
+            yield path, rules[index].result(path)
+
+
+def match_many(rules: typing.Iterable[Rule], paths: typing.Iterable,
+               is_dir: typing.Optional[typing.Callable[[typing.Any], bool]] = None
+               ) -> typing.Iterator[typing.Tuple[typing.Any, typing.Optional[MatchResult]]]:
+    """ Generate a pair of each path and its MatchResult, or None.
+
+    Paths are treated as files, unless the ``is_dir`` predicate is given.  Work is shared between paths
+    in the same directory, and whole subtrees of fixed ownership are assigned at once, so this is most
+    efficient for sorted paths.
+    """
+    matcher = ScopedMatcher(rules)
+    rules = matcher.rules
+    items = ((path, is_dir(path) if is_dir is not None else False) for path in paths)
+    for path, index in matcher.match_indices(items):
+        yield path, (rules[index].result(path) if index is not None else None)
+
+
+class CompactResults:
+    """ Match results of many paths, stored as each path and the index of the rule deciding its owners.
+
+    Rule indices are stored in an ``array('I')``, holding ``NO_RULE`` for paths that no rule matches, so a
+    result costs a few bytes beyond its path.  MatchResults are only created when results are accessed, by
+    index or by iteration.  Owners are available as tuples shared by all rules with the same owners.
+    """
+
+    NO_RULE = (1 << (8 * array('I').itemsize)) - 1
+
+    def __init__(self, rules: typing.Iterable[Rule]):
+        self.rules = list(rules)
+        if len(self.rules) >= self.NO_RULE:
+            raise ValueError('Too many rules for compact results: {}'.format(len(self.rules)))
+        self.paths = []
+        self.rule_indices = array('I')
+        owner_tuples = {}
+        self._owners = [owner_tuples.setdefault(tuple(rule.owners), tuple(rule.owners)) for rule in self.rules]
+
+    @classmethod
+    def from_paths(cls, rules: typing.Iterable[Rule], paths: typing.Iterable,
+                   is_dir: typing.Optional[typing.Callable[[typing.Any], bool]] = None) -> 'CompactResults':
+        """ Return the results of matching ``paths`` against ``rules``, as ``match_many`` does.  """
+        results = cls(rules)
+        matcher = ScopedMatcher(results.rules)
+        items = ((path, is_dir(path) if is_dir is not None else False) for path in paths)
+        append_path, append_index, no_rule = results.paths.append, results.rule_indices.append, cls.NO_RULE
+        for path, index in matcher.match_indices(items):
+            append_path(path)
+            append_index(index if index is not None else no_rule)
+        return results
+
+    def append(self, path, index: typing.Optional[int]):
+        """ Add the result of ``path``, decided by the rule at ``index`` among ``rules``, or None.  """
+        self.paths.append(path)
+        self.rule_indices.append(index if index is not None else self.NO_RULE)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def rule_index(self, i: int) -> typing.Optional[int]:
+        index = self.rule_indices[i]
+        return index if index != self.NO_RULE else None
+
+    def owners(self, i: int) -> typing.Optional[typing.Tuple[str, ...]]:
+        """ Return the owners of the ``i``-th path, or None if no rule matches it.  """
+        index = self.rule_indices[i]
+        return self._owners[index] if index != self.NO_RULE else None
+
+    def __getitem__(self, i: int) -> typing.Tuple[typing.Any, typing.Optional[MatchResult]]:
+        path, index = self.paths[i], self.rule_indices[i]
+        return path, (self.rules[index].result(path) if index != self.NO_RULE else None)
+
+    def __iter__(self) -> typing.Iterator[typing.Tuple[typing.Any, typing.Optional[MatchResult]]]:
+        """ Generate a pair of each path and its MatchResult, or None, as ``match_many`` does.  """
+        rules, no_rule = self.rules, self.NO_RULE
+        for path, index in zip(self.paths, self.rule_indices):
+            yield path, (rules[index].result(path) if index != no_rule else None)
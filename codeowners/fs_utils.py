@@ -1,11 +1,18 @@
+from collections import namedtuple
+import os
 from pathlib import Path
 import subprocess
 import typing
 
+from codeowners import codeowners
+
 
 # Possible locations of CODEOWNERS file, relative to repository root.
 _CODEOWNERS_REL_LOCATIONS = [Path('docs/CODEOWNERS'), Path('.github/CODEOWNERS'), Path('CODEOWNERS')]
 
+# Size of reads from the stdout pipe of git subprocesses.
+_READ_CHUNK_SIZE = 1 << 20
+
 
 def git_repository_root(base_dir: Path, search_parent_directories=True) -> Path:
     base_dir = Path(base_dir)
@@ -35,14 +42,196 @@ def codeowners_path(base_dir: Path) -> Path:
     return path
 
 
+def git_output_entries(args: typing.Sequence[str], cwd=None) -> typing.Iterator[str]:
+    """ Generate the NUL-terminated entries written to stdout by a git command, as they arrive.
+
+    Raises ``subprocess.CalledProcessError`` once the output is exhausted, if git failed.  The git process
+    is killed if the generator is closed early.
+    """
+    args = ['git', *args]
+    process = subprocess.Popen(args, cwd=cwd, stdout=subprocess.PIPE)
+    try:
+        remainder = b''
+        while True:
+            chunk = process.stdout.read1(_READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            *entries, remainder = (remainder + chunk).split(b'\0')
+            yield from map(os.fsdecode, entries)
+
+        if remainder:
+            yield os.fsdecode(remainder)
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, args)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+
 def list_files(paths: typing.Iterable[Path], untracked: bool = False, recursive: bool = True):
-    """ Return an iterable of Paths representing non-ignored files recognized by git. """
+    """ Return an iterator of Paths representing non-ignored files recognized by git.
+
+    Paths are streamed from ``git ls-files`` as git produces them.
+    """
     if not recursive:
         raise NotImplementedError('Only recursive traversal supported right now; got recursive: {!r}'.format(recursive))
 
     tracked_options = ['--cached', '--others'] if untracked else ['--cached']
 
-    # In the future, we should process the output in a streaming fashion.
-    ls_result = subprocess.run(['git', 'ls-files', *tracked_options, *map(str, paths)],
-                               check=True, stdout=subprocess.PIPE, universal_newlines=True)
-    return [Path(p) for p in ls_result.stdout.splitlines()]
+    return map(Path, git_output_entries(['ls-files', '-z', *tracked_options, '--', *map(str, paths)]))
+
+
+class WalkEntry(namedtuple('WalkEntryData', 'path, match_result, subtree')):
+    """ A file found by ``walk_ownership``, or, if ``subtree`` is true, a directory all of whose files at any
+    depth have the ownership given by ``match_result``.  """
+
+
+def walk_ownership(rules: typing.Iterable[codeowners.Rule], root: Path) -> typing.Iterator[WalkEntry]:
+    """ Generate the ownership of the files below ``root``, walking the filesystem in sorted order.
+
+    Directories whose files all have fixed ownership, because no rule but the one deciding it could match
+    anything inside, are not entered:  a single subtree entry stands for all of their files.  Paths are
+    relative to ``root``, which should be the repository root.  Directories named '.git' are skipped, and
+    symbolic links are not followed.
+    """
+    matcher = codeowners.ScopedMatcher(rules)
+    rules = matcher.rules
+
+    def entry(path, index, subtree):
+        return WalkEntry(path, rules[index].result(path) if index is not None else None, subtree)
+
+    def walk(dir_path, dir_parts):
+        for dir_entry in sorted(os.scandir(dir_path), key=lambda e: e.name):
+            parts = dir_parts + (dir_entry.name,)
+            path = '/'.join(parts)
+            if not dir_entry.is_dir(follow_symlinks=False):
+                yield entry(path, matcher.match_index(path), subtree=False)
+            elif dir_entry.name != '.git':
+                scope = matcher.scope(parts)
+                if scope.fixed:
+                    yield entry(path, scope.fallback, subtree=True)
+                else:
+                    yield from walk(dir_entry.path, parts)
+
+    root_scope = matcher.scope(())
+    if root_scope.fixed:
+        yield entry('.', root_scope.fallback, subtree=True)
+    else:
+        yield from walk(str(root), ())
+
+
+def git_output(args: typing.Sequence[str], cwd=None) -> str:
+    """ Return the stdout of a git command, without the trailing newline.  """
+    result = subprocess.run(['git', *args], cwd=cwd, check=True, stdout=subprocess.PIPE, universal_newlines=True)
+    return result.stdout.rstrip('\n')
+
+
+def rev_parse(rev: str, cwd=None) -> str:
+    """ Return the object ID named by ``rev``.  """
+    return git_output(['rev-parse', '--verify', rev], cwd=cwd)
+
+
+def git_directory(cwd=None) -> Path:
+    """ Return the .git directory of the repository containing ``cwd``, shared by all its worktrees.  """
+    git_dir = Path(git_output(['rev-parse', '--git-common-dir'], cwd=cwd))
+    return (Path(cwd) / git_dir if cwd is not None else git_dir).resolve()
+
+
+def list_tree_files(tree: str, cwd=None) -> typing.Iterator[str]:
+    """ Generate the paths of the files in a git tree, or in the tree of a commit, in git's sort order.  """
+    return git_output_entries(['ls-tree', '-r', '-z', '--name-only', '--full-tree', tree], cwd=cwd)
+
+
+def diff_tree(old_tree: str, new_tree: str, cwd=None) -> typing.Iterator[typing.Tuple[str, str]]:
+    """ Generate a pair of the status letter (e.g. 'A', 'M' or 'D') and path of each file that differs
+    between two trees.  Renames are reported as a deletion and an addition.  """
+    entries = git_output_entries(['diff-tree', '-r', '-z', '--no-renames', '--name-status', old_tree, new_tree],
+                                 cwd=cwd)
+    return zip(entries, entries)
+
+
+def changed_files(rev: str, cwd=None) -> typing.Iterator[str]:
+    """ Generate the paths of the files changed by a commit, or by every commit of a range such as
+    ``main..feature``, each path once, as git reports them.  Renames are reported as a deletion and an
+    addition.  The files changed by a merge commit are those differing from its first parent.  """
+    range_options = [] if '..' in rev or rev.startswith('^') else ['-n', '1', '-m', '--first-parent']
+    entries = git_output_entries(['log', '-z', '--format=', '--name-only', '--no-renames', *range_options, rev],
+                                 cwd=cwd)
+    seen = set()
+    for path in entries:
+        if path and path not in seen:
+            seen.add(path)
+            yield path
+
+
+def read_blob(oid: str, cwd=None) -> bytes:
+    """ Return the content of a git blob.  """
+    return subprocess.run(['git', 'cat-file', 'blob', oid], cwd=cwd, check=True, stdout=subprocess.PIPE).stdout
+
+
+def codeowners_blob(tree: str, cwd=None) -> typing.Tuple[Path, str]:
+    """ Return the path, relative to the repository root, and the blob ID of the CODEOWNERS file in a tree.  """
+    entries = git_output_entries(['ls-tree', '-z', '--full-tree', tree, '--', *map(str, _CODEOWNERS_REL_LOCATIONS)],
+                                 cwd=cwd)
+    blobs = {}
+    for entry in entries:
+        info, path = entry.split('\t', 1)
+        blobs[Path(path)] = info.split()[2]
+
+    location = next((location for location in _CODEOWNERS_REL_LOCATIONS if location in blobs), None)
+    if location is None:
+        raise FileNotFoundError("Could not find CODEOWNERS file in tree {} in any of the following locations: "
+                                "{}".format(tree, '; '.join(map(str, _CODEOWNERS_REL_LOCATIONS))))
+    return location, blobs[location]
+
+
+class BlobReader:
+    """ A persistent ``git cat-file --batch`` process, reading any number of blobs without a git process per blob.
+
+    Objects are named as git does, e.g. by object ID or as ``<rev>:<path>``.  The reader is a context manager,
+    which stops the process on exit.
+    """
+
+    def __init__(self, cwd=None):
+        self._process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=cwd, stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE)
+
+    def read(self, name: str) -> typing.Optional[bytes]:
+        """ Return the content of the blob named ``name``, or None if there is no such blob.  """
+        if '\n' in name:
+            raise ValueError('Object name must not contain a newline: {!r}'.format(name))
+        self._process.stdin.write(os.fsencode(name) + b'\n')
+        self._process.stdin.flush()
+
+        header = self._process.stdout.readline()
+        if not header:
+            raise subprocess.CalledProcessError(self._process.wait(), ['git', 'cat-file', '--batch'])
+        fields = header.split()
+        if fields[-1] in (b'missing', b'ambiguous'):
+            return None
+        _, object_type, size = fields
+        content = self._process.stdout.read(int(size) + 1)[:-1]
+        return content if object_type == b'blob' else None
+
+    def close(self):
+        self._process.stdin.close()
+        self._process.wait()
+        self._process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_codeowners(rev: str, reader: BlobReader) -> typing.Tuple[Path, bytes]:
+    """ Return the path, relative to the repository root, and the content of the CODEOWNERS file in a revision.  """
+    for location in _CODEOWNERS_REL_LOCATIONS:
+        content = reader.read('{}:{}'.format(rev, location.as_posix()))
+        if content is not None:
+            return location, content
+    raise FileNotFoundError("Could not find CODEOWNERS file in revision {} in any of the following locations: "
+                            "{}".format(rev, '; '.join(map(str, _CODEOWNERS_REL_LOCATIONS))))
@@ -0,0 +1,126 @@
+""" Impact analysis of changes to CODEOWNERS rules:  which files change owners between two rule sets.
+
+Rules are compared by their pattern and owners, in file order.  Only the rules added, removed or moved
+between the two sets can change the owners of a file, so only the files matched by one of them are
+evaluated under both sets.  The others are skipped by a ``ScopedMatcher`` over the changed rules, which
+passes over whole directories that none of them can match.
+"""
+from collections import namedtuple
+import difflib
+import typing
+
+from codeowners import codeowners
+
+
+ADDED, REMOVED, MOVED = 'added', 'removed', 'moved'
+
+
+class RuleChange(namedtuple('RuleChangeData', 'kind, old_rule, new_rule')):
+    """ A rule added, removed, or moved relative to the other rules, between two rule sets.
+
+    ``old_rule`` is None for an added rule, and ``new_rule`` is None for a removed rule.  A rule whose
+    owners change is removed, and another added.
+    """
+
+    def summary(self) -> str:
+        if self.kind == ADDED:
+            return '+ {}:{}: {}'.format(self.new_rule.source_filename, self.new_rule.source_lineno,
+                                        self.new_rule.source_line.strip())
+        if self.kind == REMOVED:
+            return '- {}:{}: {}'.format(self.old_rule.source_filename, self.old_rule.source_lineno,
+                                        self.old_rule.source_line.strip())
+        return '~ {}:{} -> {}:{}: {}'.format(self.old_rule.source_filename, self.old_rule.source_lineno,
+                                             self.new_rule.source_filename, self.new_rule.source_lineno,
+                                             self.new_rule.source_line.strip())
+
+
+class OwnershipChange(namedtuple('OwnershipChangeData', 'path, old_result, new_result')):
+    """ The MatchResults, or None, of a file whose owners differ between two rule sets.  """
+
+    @staticmethod
+    def _owners_text(match_result: typing.Optional[codeowners.MatchResult]) -> str:
+        return ' '.join(match_result.owners) if match_result is not None else '<NONE>'
+
+    def summary(self) -> str:
+        return '{}: {} -> {}'.format(self.path, self._owners_text(self.old_result), self._owners_text(self.new_result))
+
+    def as_dict(self) -> dict:
+        def fields(prefix, match_result):
+            if match_result is None:
+                return {prefix + 'owners': None, prefix + 'source_lineno': None}
+            return {prefix + 'owners': list(match_result.owners), prefix + 'source_lineno': match_result.source_lineno}
+
+        record = {'path': str(self.path)}
+        record.update(fields('old_', self.old_result))
+        record.update(fields('new_', self.new_result))
+        return record
+
+
+def _rule_key(rule: codeowners.Rule):
+    pattern = rule.pattern
+    return pattern.pattern, pattern.dir_only, pattern.root_only, pattern.invert, tuple(rule.owners)
+
+
+def rule_changes(old_rules: typing.Sequence[codeowners.Rule],
+                 new_rules: typing.Sequence[codeowners.Rule]) -> typing.List[RuleChange]:
+    """ Return the rules added, removed or moved between ``old_rules`` and ``new_rules``, as returned by
+    ``parse_codeowners``.
+
+    The rules kept in the same relative order are the longest common subsequence of both sets, in file
+    order; every other rule is removed from the old set or added to the new one.  A rule that is both is
+    reported once, as moved.
+    """
+    old_in_order, new_in_order = old_rules[::-1], new_rules[::-1]
+    matcher = difflib.SequenceMatcher(None, [_rule_key(rule) for rule in old_in_order],
+                                      [_rule_key(rule) for rule in new_in_order], autojunk=False)
+    removed, added = [], []
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if tag in ('delete', 'replace'):
+            removed.extend(old_in_order[old_start:old_end])
+        if tag in ('insert', 'replace'):
+            added.extend(new_in_order[new_start:new_end])
+
+    added_by_key = {}
+    for rule in added:
+        added_by_key.setdefault(_rule_key(rule), []).append(rule)
+
+    changes = []
+    moved_rules = set()
+    for rule in removed:
+        candidates = added_by_key.get(_rule_key(rule))
+        if candidates:
+            new_rule = candidates.pop(0)
+            moved_rules.add(id(new_rule))
+            changes.append(RuleChange(MOVED, rule, new_rule))
+        else:
+            changes.append(RuleChange(REMOVED, rule, None))
+    changes.extend(RuleChange(ADDED, None, rule) for rule in added if id(rule) not in moved_rules)
+    return changes
+
+
+def ownership_changes(old_rules: typing.Sequence[codeowners.Rule], new_rules: typing.Sequence[codeowners.Rule],
+                      paths: typing.Iterable) -> typing.Iterator[OwnershipChange]:
+    """ Generate the changes of owners of the files among ``paths``, from ``old_rules`` to ``new_rules``.
+
+    The owners of a file can only change if one of the changed rules matches it:  otherwise, the same
+    unchanged rules match it in both sets, in the same order.  Only those files are matched against both
+    sets, so the cost depends on the files covered by the changed rules.  Paths are best given in sorted
+    order, as by ``git ls-files``, so directories no changed rule can match are skipped at once.
+    """
+    changes = rule_changes(old_rules, new_rules)
+    if not changes:
+        return
+    changed_rules = [change.old_rule for change in changes if change.old_rule is not None]
+    changed_rules.extend(change.new_rule for change in changes if change.new_rule is not None)
+
+    changed_matcher = codeowners.ScopedMatcher(changed_rules)
+    old_matcher, new_matcher = codeowners.ScopedMatcher(old_rules), codeowners.ScopedMatcher(new_rules)
+    for path, changed_index in changed_matcher.match_indices((path, False) for path in paths):
+        if changed_index is None:
+            continue
+        old_index, new_index = old_matcher.match_index(path), new_matcher.match_index(path)
+        old_owners = old_rules[old_index].owners if old_index is not None else None
+        new_owners = new_rules[new_index].owners if new_index is not None else None
+        if old_owners != new_owners:
+            yield OwnershipChange(path, old_rules[old_index].result(path) if old_index is not None else None,
+                                  new_rules[new_index].result(path) if new_index is not None else None)
@@ -0,0 +1,140 @@
+""" Output of match results in text and structured formats, through a large write buffer.
+
+Every structured record holds the path, its owners, and the source file and line number of the rule
+deciding them, or nulls if no rule matches.  The formats are:
+
+* ``text``: ``path: owners`` lines, as printed by ``MatchResult.summary``, or ``path: <NONE>``.
+* ``json``: a JSON array of record objects, one per line.
+* ``jsonl``: one JSON record object per line.
+* ``csv``: a header line, then ``path,owners,source_filename,source_lineno`` rows, owners separated by spaces.
+* ``nul``: the same four fields of each record, each terminated by a NUL character, as in ``git ls-files -z``.
+"""
+import csv
+import json
+import typing
+
+from codeowners import codeowners
+
+
+FORMATS = ['text', 'json', 'jsonl', 'csv', 'nul']
+
+# Size of text buffered before it is written to the underlying stream, in characters.
+DEFAULT_BUFFER_SIZE = 1 << 20
+
+CSV_FIELDS = ['path', 'owners', 'source_filename', 'source_lineno']
+
+
+class BufferedOutput:
+    """ A text writer that encodes and writes to a binary stream in large chunks.
+
+    Text is encoded as UTF-8, with undecodable path bytes restored by 'surrogateescape'.  The buffer is
+    flushed when it holds ``buffer_size`` characters, and when the writer is used as a context manager,
+    on exit.
+    """
+
+    def __init__(self, stream: typing.BinaryIO, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        self._stream = stream
+        self._buffer_size = buffer_size
+        self._chunks = []
+        self._size = 0
+
+    def write(self, text: str):
+        self._chunks.append(text)
+        self._size += len(text)
+        if self._size >= self._buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._chunks:
+            self._stream.write(''.join(self._chunks).encode('utf-8', 'surrogateescape'))
+            self._chunks.clear()
+            self._size = 0
+        self._stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+
+def result_record(path, match_result: typing.Optional[codeowners.MatchResult]) -> dict:
+    """ Return the JSON-compatible record of a match result, with null fields if no rule matched.  """
+    if match_result is None:
+        return {'path': str(path), 'owners': None, 'source_filename': None, 'source_lineno': None}
+    return {'path': str(path), 'owners': list(match_result.owners),
+            'source_filename': str(match_result.source_filename), 'source_lineno': match_result.source_lineno}
+
+
+class ResultWriter:
+    """ A writer of match results in one of the output ``FORMATS``, as they are produced.
+
+    ``extra_fields`` name fields, such as the revision or repository of the results, that precede the
+    fields of every record; their values are given to ``write``.  In the text format, they prefix the path,
+    each followed by ':'.  ``close`` must be called after the last result, to complete the JSON array.
+    """
+
+    def __init__(self, output_format: str, output: typing.TextIO, extra_fields: typing.Sequence[str] = ()):
+        if output_format not in FORMATS:
+            raise ValueError('Unknown output format: {!r}'.format(output_format))
+        self.output_format = output_format
+        self.extra_fields = list(extra_fields)
+        self.count = 0
+        self._output = output
+        self._write_record = getattr(self, '_write_' + output_format)
+        self._csv_writer = None
+        if output_format == 'csv':
+            self._csv_writer = csv.writer(output, lineterminator='\n')
+            self._csv_writer.writerow(self.extra_fields + CSV_FIELDS)
+        elif output_format == 'json':
+            output.write('[')
+
+    def write(self, path, match_result: typing.Optional[codeowners.MatchResult], extra_values: typing.Sequence = ()):
+        self.count += 1
+        self._write_record(path, match_result, extra_values)
+
+    def close(self):
+        if self.output_format == 'json':
+            self._output.write('\n]\n' if self.count else ']\n')
+
+    def _record(self, path, match_result, extra_values) -> dict:
+        record = dict(zip(self.extra_fields, extra_values))
+        record.update(result_record(path, match_result))
+        return record
+
+    def _write_text(self, path, match_result, extra_values):
+        prefix = ''.join('{}:'.format(value) for value in extra_values)
+        self._output.write(prefix + (match_result.summary() if match_result else '{}: <NONE>'.format(path)) + '\n')
+
+    def _write_jsonl(self, path, match_result, extra_values):
+        self._output.write(json.dumps(self._record(path, match_result, extra_values)) + '\n')
+
+    def _write_json(self, path, match_result, extra_values):
+        self._output.write((',\n' if self.count > 1 else '\n') +
+                           json.dumps(self._record(path, match_result, extra_values)))
+
+    @staticmethod
+    def _fields(path, match_result, extra_values) -> typing.List[str]:
+        if match_result is None:
+            fields = [str(path), '', '', '']
+        else:
+            fields = [str(path), ' '.join(match_result.owners), str(match_result.source_filename),
+                      str(match_result.source_lineno)]
+        return [str(value) for value in extra_values] + fields
+
+    def _write_csv(self, path, match_result, extra_values):
+        self._csv_writer.writerow(self._fields(path, match_result, extra_values))
+
+    def _write_nul(self, path, match_result, extra_values):
+        self._output.write('\0'.join(self._fields(path, match_result, extra_values)) + '\0')
+
+
+def write_results(results: typing.Iterable[typing.Tuple[typing.Any, typing.Optional[codeowners.MatchResult]]],
+                  output_format: str, output: typing.TextIO) -> int:
+    """ Write pairs of a path and its MatchResult, or None, as generated by ``codeowners.match_many``, in
+    ``output_format``, as they are generated.  Return the number of results written.  """
+    writer = ResultWriter(output_format, output)
+    for path, match_result in results:
+        writer.write(path, match_result)
+    writer.close()
+    return writer.count
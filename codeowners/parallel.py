@@ -0,0 +1,118 @@
+""" Matching of paths against rules in a pool of worker processes.
+
+"""
+import collections
+import itertools
+import multiprocessing
+import os
+import typing
+
+from codeowners import batch, codeowners
+
+
+# Matcher of each worker process, created once by the pool initializer.
+_worker_matcher = None
+
+
+def _init_worker(rules):
+    global _worker_matcher
+    _worker_matcher = codeowners.ScopedMatcher(rules)
+
+
+def _match_chunk(chunk):
+    return [index for _, index in _worker_matcher.match_indices(chunk)]
+
+
+def match_parallel(rules: typing.Iterable[codeowners.Rule], paths: typing.Iterable, jobs: int = None,
+                   is_dir: typing.Optional[typing.Callable[[typing.Any], bool]] = None, chunk_size: int = 4096
+                   ) -> typing.Iterator[typing.Tuple[typing.Any, typing.Optional[codeowners.MatchResult]]]:
+    """ Generate a pair of each path and its MatchResult, or None, like ``codeowners.match_many``.
+
+    Chunks of ``chunk_size`` paths are matched by ``jobs`` worker processes (by default, one per CPU).
+    Each worker receives the rules once, when it starts, and returns only the indices of the matching
+    rules.  Results are generated in the order of ``paths``, and are identical to those of ``match_many``.
+    """
+    rules = list(rules)
+    if jobs == 1:
+        yield from codeowners.match_many(rules, paths, is_dir=is_dir)
+        return
+
+    jobs = jobs or os.cpu_count() or 1
+    with multiprocessing.Pool(jobs, initializer=_init_worker, initargs=(rules,)) as pool:
+        yield from _match_chunks(pool, jobs, rules, paths, is_dir, chunk_size, _match_chunk)
+
+
+def _match_chunks(pool, jobs, rules, paths, is_dir, chunk_size, match_chunk, *args):
+    """ Generate the results of matching chunks of ``paths`` in ``pool``, by ``match_chunk(*args, tasks)``.  """
+    paths = iter(paths)
+    # Bound the number of chunks in flight, so memory use does not depend on the number of paths.
+    max_pending = 2 * jobs
+    pending = collections.deque()
+    for chunk in iter(lambda: list(itertools.islice(paths, chunk_size)), []):
+        tasks = [(str(p), is_dir(p) if is_dir is not None else False) for p in chunk]
+        pending.append((chunk, pool.apply_async(match_chunk, args + (tasks,))))
+        if len(pending) >= max_pending:
+            yield from _chunk_results(rules, *pending.popleft())
+    while pending:
+        yield from _chunk_results(rules, *pending.popleft())
+
+
+def _chunk_results(rules, chunk, async_result):
+    for path, index in zip(chunk, async_result.get()):
+        yield path, (rules[index].result(path) if index is not None else None)
+
+
+# Rules of each worker process of a MatchPool, created once by the pool initializer, and the matcher of each.
+_worker_rules = None
+_worker_matchers = {}
+
+
+def _init_pool_worker(use_cache):
+    global _worker_rules
+    _worker_rules = batch.RulesCache(use_cache)
+
+
+def _match_source_chunk(source, chunk):
+    matcher = _worker_matchers.get(source.key)
+    if matcher is None:
+        matcher = _worker_matchers[source.key] = codeowners.ScopedMatcher(_worker_rules.rules(source))
+    return [index for _, index in matcher.match_indices(chunk)]
+
+
+class MatchPool:
+    """ Worker processes that match paths against the rules of several CODEOWNERS contents, such as those of
+    several revisions, created once for all of them.
+
+    Contents are ``batch.RepositoryRules``.  Unlike ``match_parallel``, workers receive the content with each
+    chunk, and parse the rules of each distinct content, by its key, once.  With ``jobs`` of 1, paths are
+    matched in this process.
+    """
+
+    def __init__(self, jobs: int = None, use_cache: bool = False, chunk_size: int = 4096):
+        self.jobs = 1 if jobs == 1 else jobs or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.rules_cache = batch.RulesCache(use_cache)
+        self._pool = None
+        if self.jobs != 1:
+            self._pool = multiprocessing.Pool(self.jobs, initializer=_init_pool_worker, initargs=(use_cache,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._pool is not None:
+            self._pool.terminate()
+
+    def rules(self, source: batch.RepositoryRules) -> typing.List[codeowners.Rule]:
+        return self.rules_cache.rules(source)
+
+    def match(self, source: batch.RepositoryRules, paths: typing.Iterable,
+              is_dir: typing.Optional[typing.Callable[[typing.Any], bool]] = None
+              ) -> typing.Iterator[typing.Tuple[typing.Any, typing.Optional[codeowners.MatchResult]]]:
+        """ Generate a pair of each path and its MatchResult, or None, under the rules of ``source``, like
+        ``codeowners.match_many``.  """
+        rules = self.rules(source)
+        if self._pool is None:
+            return codeowners.match_many(rules, paths, is_dir=is_dir)
+        return _match_chunks(self._pool, self.jobs, rules, paths, is_dir, self.chunk_size, _match_source_chunk,
+                             source)
@@ -0,0 +1,192 @@
+""" Optional instrumentation of rule evaluation and of the phases of a run.
+
+Instrumentation costs nothing unless a profile is active:  only while it is, ``Pattern.match_parts`` and
+``Pattern.subtree_match`` are replaced by wrappers recording the number of evaluations, matches and time
+of each pattern, and the functions ``phase`` and ``iterate`` time the phases of a run.  For example::
+
+    with profiling.profile() as profiler:
+        with profiling.phase('parse'):
+            rules = codeowners.parse_codeowners(lines, source_filename)
+        profiling.observe_rules(rules)
+        results = list(profiling.iterate('match', codeowners.match_many(rules, paths)))
+    telemetry.send(profiler.as_dict())
+
+Only evaluations in the current process are recorded, not those of worker processes.
+"""
+from collections import namedtuple
+import contextlib
+import time
+import typing
+
+from codeowners import codeowners
+
+
+# The active profiler, if any.
+_active = None
+
+
+class RuleProfile(namedtuple('RuleProfileData', 'rule, evaluations, hits, seconds, subtree_evaluations, '
+                                                'subtree_seconds')):
+    """ The evaluations of a rule's pattern against paths, and against directories by ``subtree_match``.  """
+
+    @property
+    def misses(self) -> int:
+        return self.evaluations - self.hits
+
+    @property
+    def hit_ratio(self) -> float:
+        return self.hits / self.evaluations if self.evaluations else 0.0
+
+    @property
+    def location(self) -> str:
+        return '{}:{}'.format(self.rule.source_filename, self.rule.source_lineno)
+
+    def as_dict(self) -> dict:
+        return {'source_filename': str(self.rule.source_filename), 'source_lineno': self.rule.source_lineno,
+                'pattern': str(self.rule.pattern), 'evaluations': self.evaluations, 'hits': self.hits,
+                'seconds': self.seconds, 'subtree_evaluations': self.subtree_evaluations,
+                'subtree_seconds': self.subtree_seconds}
+
+
+class Profiler:
+    """ Evaluation statistics of patterns, and the time spent in each phase of a run.
+
+    Phase times are exclusive:  time spent in a phase nested within another is only counted once, in the
+    nested phase.
+    """
+
+    def __init__(self):
+        self.phase_seconds = {}
+        self.rules = []
+        # Statistics of each pattern: [evaluations, hits, seconds, subtree evaluations, subtree seconds].
+        self._pattern_stats = {}
+        self._phase_stack = []
+        self._phase_start = None
+
+    def _pattern_entry(self, pattern: codeowners.Pattern) -> list:
+        entry = self._pattern_stats.get(pattern)
+        if entry is None:
+            entry = self._pattern_stats[pattern] = [0, 0, 0.0, 0, 0.0]
+        return entry
+
+    def _switch_phase(self):
+        now = time.perf_counter()
+        if self._phase_stack:
+            name = self._phase_stack[-1]
+            self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + now - self._phase_start
+        self._phase_start = now
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """ Count the time spent in the block towards the phase ``name``.  """
+        self._switch_phase()
+        self._phase_stack.append(name)
+        try:
+            yield
+        finally:
+            self._switch_phase()
+            self._phase_stack.pop()
+
+    def iterate(self, name: str, iterable: typing.Iterable) -> typing.Iterator:
+        """ Generate the items of ``iterable``, counting the time spent producing them towards ``name``.  """
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def rule_profiles(self, rules: typing.Optional[typing.Iterable[codeowners.Rule]] = None
+                      ) -> typing.List[RuleProfile]:
+        """ Return the profiles of the evaluated rules among ``rules``, by default the observed rules, most
+        costly first.  """
+        profiles = []
+        for rule in (rules if rules is not None else self.rules):
+            entry = self._pattern_stats.get(rule.pattern)
+            if entry is not None:
+                profiles.append(RuleProfile(rule, *entry))
+        return sorted(profiles, key=lambda profile: profile.seconds + profile.subtree_seconds, reverse=True)
+
+    def as_dict(self, rules: typing.Optional[typing.Iterable[codeowners.Rule]] = None) -> dict:
+        """ Return the JSON-compatible representation of the phase times and of the rule profiles.  """
+        return {'phases': dict(self.phase_seconds),
+                'rules': [profile.as_dict() for profile in self.rule_profiles(rules)]}
+
+
+@contextlib.contextmanager
+def profile() -> typing.Iterator[Profiler]:
+    """ Record evaluations of patterns, and phases, in a new Profiler until the block exits.
+
+    Profiles cannot be nested.  The instrumentation applies to all threads.
+    """
+    global _active
+    if _active is not None:
+        raise RuntimeError('A profile is already active.')
+
+    profiler = Profiler()
+    match_parts, subtree_match = codeowners.Pattern.match_parts, codeowners.Pattern.subtree_match
+
+    def profiled_match_parts(pattern, parts, is_dir=False):
+        start = time.perf_counter()
+        result = match_parts(pattern, parts, is_dir=is_dir)
+        entry = profiler._pattern_entry(pattern)
+        entry[2] += time.perf_counter() - start
+        entry[0] += 1
+        entry[1] += bool(result)
+        return result
+
+    def profiled_subtree_match(pattern, dir_parts):
+        start = time.perf_counter()
+        result = subtree_match(pattern, dir_parts)
+        entry = profiler._pattern_entry(pattern)
+        entry[4] += time.perf_counter() - start
+        entry[3] += 1
+        return result
+
+    codeowners.Pattern.match_parts = profiled_match_parts
+    codeowners.Pattern.subtree_match = profiled_subtree_match
+    _active = profiler
+    try:
+        yield profiler
+    finally:
+        _active = None
+        codeowners.Pattern.match_parts = match_parts
+        codeowners.Pattern.subtree_match = subtree_match
+
+
+@contextlib.contextmanager
+def phase(name: str):
+    """ Count the time spent in the block towards the phase ``name`` of the active profile, if any.  """
+    if _active is None:
+        yield
+    else:
+        with _active.phase(name):
+            yield
+
+
+def iterate(name: str, iterable: typing.Iterable) -> typing.Iterable:
+    """ Return ``iterable``, timed as the phase ``name`` of the active profile, if any.  """
+    return _active.iterate(name, iterable) if _active is not None else iterable
+
+
+def observe_rules(rules: typing.Iterable[codeowners.Rule]):
+    """ Report the evaluations of ``rules`` in the active profile, if any.  """
+    if _active is not None:
+        _active.rules.extend(rules)
+
+
+def format_report(profiler: Profiler, limit: typing.Optional[int] = 20) -> typing.Iterator[str]:
+    """ Generate the lines of a human-readable report of phase times and of the ``limit`` most costly rules.  """
+    yield '{:<20} {:>12}'.format('PHASE', 'SECONDS')
+    for name, seconds in sorted(profiler.phase_seconds.items(), key=lambda item: item[1], reverse=True):
+        yield '{:<20} {:>12.6f}'.format(name, seconds)
+
+    yield ''
+    row_format = '{:>12} {:>12} {:>7} {:>12} {:>12}  {:<30}  {}'
+    yield row_format.format('SECONDS', 'EVALUATIONS', 'HIT%', 'SUBTREE_SEC', 'SUBTREE_EVAL', 'RULE', 'PATTERN')
+    for profile in profiler.rule_profiles()[:limit]:
+        yield row_format.format('{:.6f}'.format(profile.seconds), profile.evaluations,
+                                '{:.1%}'.format(profile.hit_ratio), '{:.6f}'.format(profile.subtree_seconds),
+                                profile.subtree_evaluations, profile.location, profile.rule.pattern)
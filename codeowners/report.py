@@ -0,0 +1,181 @@
+""" Ownership coverage summaries of directories.
+
+"""
+from collections import Counter, namedtuple
+import json
+from pathlib import PurePath
+import typing
+
+from codeowners import codeowners
+
+
+class DirectoryCoverage(namedtuple('DirectoryCoverageData', 'path, file_count, owned_count, owner_sets')):
+    """ Ownership of the files at any depth below a directory.
+
+    ``owner_sets`` is the set of distinct owner tuples of the owned files.
+    """
+
+    @property
+    def unowned_count(self) -> int:
+        return self.file_count - self.owned_count
+
+    @property
+    def owned_fraction(self) -> float:
+        return self.owned_count / self.file_count if self.file_count else 1.0
+
+    def as_dict(self) -> dict:
+        return {'path': self.path, 'files': self.file_count, 'owned': self.owned_count,
+                'unowned': self.unowned_count, 'owned_fraction': self.owned_fraction,
+                'owner_sets': len(self.owner_sets)}
+
+
+class _Accumulator:
+    def __init__(self, dir_parts):
+        self.dir_parts = dir_parts
+        self.file_count = 0
+        self.owned_count = 0
+        self.owner_sets = set()
+
+    def add(self, other: '_Accumulator'):
+        self.file_count += other.file_count
+        self.owned_count += other.owned_count
+        self.owner_sets |= other.owner_sets
+
+    def coverage(self) -> DirectoryCoverage:
+        return DirectoryCoverage(path='/'.join(self.dir_parts) or '.', file_count=self.file_count,
+                                 owned_count=self.owned_count, owner_sets=frozenset(self.owner_sets))
+
+
+def directory_coverage(results: typing.Iterable[typing.Tuple[typing.Any, typing.Optional[codeowners.MatchResult]]],
+                       max_depth: typing.Optional[int] = None) -> typing.Iterator[DirectoryCoverage]:
+    """ Generate the coverage of every directory containing files among ``results``, bottom-up.
+
+    ``results`` are pairs of a file path and its MatchResult, or None, as generated by
+    ``codeowners.match_many``, in which the files of each directory must be consecutive, as in sorted
+    order.  Each directory is generated once all of its files have been seen, after its subdirectories, and
+    the root directory, '.', is generated last.  Only directories up to ``max_depth`` components deep are
+    generated.  Memory is bounded by the depth of the tree.
+    """
+    # stack[k] accumulates the directory with components dir_parts[:k] of the current path.
+    stack = [_Accumulator(())]
+
+    def pop():
+        accumulator = stack.pop()
+        stack[-1].add(accumulator)
+        if max_depth is None or len(accumulator.dir_parts) <= max_depth:
+            yield accumulator.coverage()
+
+    for path, result in results:
+        dir_parts = PurePath(path).parts[:-1]
+        depth = 1
+        while depth < min(len(stack), len(dir_parts) + 1) and stack[depth].dir_parts[-1] == dir_parts[depth - 1]:
+            depth += 1
+        while len(stack) > depth:
+            yield from pop()
+        for k in range(depth, len(dir_parts) + 1):
+            stack.append(_Accumulator(dir_parts[:k]))
+
+        accumulator = stack[-1]
+        accumulator.file_count += 1
+        if result is not None and result.owners:
+            accumulator.owned_count += 1
+            accumulator.owner_sets.add(tuple(result.owners))
+
+    while len(stack) > 1:
+        yield from pop()
+    if max_depth is None or max_depth >= 0:
+        yield stack[0].coverage()
+
+
+def format_table(coverages: typing.Iterable[DirectoryCoverage]) -> typing.Iterator[str]:
+    """ Generate the lines of a human-readable table of directory coverage.  """
+    row_format = '{:>9} {:>9} {:>9} {:>7} {:>10}  {}'
+    yield row_format.format('FILES', 'OWNED', 'UNOWNED', 'OWNED%', 'OWNER_SETS', 'DIRECTORY')
+    for coverage in coverages:
+        yield row_format.format(coverage.file_count, coverage.owned_count, coverage.unowned_count,
+                                '{:.1%}'.format(coverage.owned_fraction), len(coverage.owner_sets), coverage.path)
+
+
+def format_json(coverages: typing.Iterable[DirectoryCoverage]) -> typing.Iterator[str]:
+    """ Generate the lines of a JSON array of directory coverage objects.  """
+    yield '['
+    separator = ''
+    for coverage in coverages:
+        yield separator + json.dumps(coverage.as_dict())
+        separator = ','
+    yield ']'
+
+
+class RuleStats(namedtuple('RuleStatsData', 'rule, win_count, shadowed_by')):
+    """ The number of files for which a rule decides ownership, and the rule that shadows it, if any.  """
+
+    @property
+    def location(self) -> str:
+        return '{}:{}'.format(self.rule.source_filename, self.rule.source_lineno)
+
+
+def shadowing_rules(rules: typing.Sequence[codeowners.Rule]) -> typing.Dict[int, int]:
+    """ Return a mapping of the index of each rule that can never decide ownership of a file, because a
+    rule of higher priority matches every file it matches, to the index of that rule.
+
+    A rule is shadowed by an earlier rule with an identical pattern, or by an earlier rule that matches
+    every file below the directory of the rule's literal prefix.
+    """
+    shadowed = {}
+    first_index = {}
+    prefixes = []
+    for j, rule in enumerate(rules):
+        pattern = rule.pattern
+        key = (pattern.pattern, pattern.dir_only, pattern.root_only, pattern.invert)
+        if key in first_index:
+            shadowed[j] = first_index[key]
+            continue
+        first_index[key] = j
+
+        if pattern.invert or pattern.dir_only:
+            continue
+        prefix = pattern.literal_prefix()
+        if prefix is None:
+            prefix = ()
+        elif len(prefix) == len(pattern.pattern.parts):
+            # A pattern without wildcards also matches the file named by its prefix.
+            prefix = prefix[:-1]
+        prefixes.append((prefix, j))
+
+    # Visit the directories in sorted order, so the matcher shares work between them.
+    matcher = codeowners.ScopedMatcher(rules)
+    for prefix, j in sorted(prefixes):
+        fallback = matcher.scope(prefix).fallback
+        if fallback is not None and fallback < j:
+            shadowed[j] = fallback
+    return shadowed
+
+
+def rule_stats(rules: typing.Sequence[codeowners.Rule],
+               results: typing.Iterable[typing.Tuple[typing.Any, typing.Optional[codeowners.MatchResult]]]
+               ) -> typing.List[RuleStats]:
+    """ Return the statistics of every rule, in the order of the CODEOWNERS lines, over ``results``.
+
+    ``results`` are pairs of a file path and its MatchResult, or None, as generated by
+    ``codeowners.match_many`` for ``rules``.
+    """
+    win_counts = Counter((result.source_filename, result.source_lineno) for _, result in results
+                         if result is not None)
+    shadowed = shadowing_rules(rules)
+    stats = [RuleStats(rule=rule, win_count=win_counts[(rule.source_filename, rule.source_lineno)],
+                       shadowed_by=rules[shadowed[i]] if i in shadowed else None)
+             for i, rule in enumerate(rules)]
+    return stats[::-1]
+
+
+def format_rule_stats(stats: typing.Iterable[RuleStats]) -> typing.Iterator[str]:
+    """ Generate the lines of a human-readable table of rule statistics.  """
+    row_format = '{:>9}  {:<30}  {}'
+    yield row_format.format('WINS', 'RULE', 'NOTES')
+    for stat in stats:
+        notes = []
+        if stat.win_count == 0:
+            notes.append('never wins')
+        if stat.shadowed_by is not None:
+            notes.append('shadowed by line {}'.format(stat.shadowed_by.source_lineno))
+        yield row_format.format(stat.win_count, stat.location, '; '.join(notes)).rstrip()
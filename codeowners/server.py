@@ -0,0 +1,174 @@
+""" A resident server answering ownership queries over a Unix domain socket, and its client.
+
+The protocol is line-based: each request is a JSON object on one line, answered by a JSON object on one
+line.  Supported requests are:
+
+* ``{"paths": ["src/main.c", ...]}``, answered by ``{"results": [...]}``, with one result object per path,
+  holding ``path`` and, if a rule matches, ``owners``, ``source_filename`` and ``source_lineno``.
+* ``{"owner": "@org/team"}``, answered by ``{"paths": [...]}``, the tracked files owned by the owner.
+
+Errors are answered by ``{"error": "message"}``.  Paths are relative to the repository root.
+"""
+import json
+import logging
+import os
+from pathlib import Path
+import socket
+import socketserver
+import threading
+import typing
+
+from codeowners import codeowners, fs_utils
+
+
+_logger = logging.getLogger(__file__)
+
+
+def default_socket_path(repo_root: Path) -> Path:
+    return fs_utils.git_directory(cwd=repo_root) / 'codeowners.sock'
+
+
+def result_dict(path: str, match_result: typing.Optional[codeowners.MatchResult]) -> dict:
+    """ Return the JSON-compatible representation of a match result.  """
+    if match_result is None:
+        return {'path': path, 'owners': None}
+    return {'path': path, 'owners': match_result.owners, 'source_filename': str(match_result.source_filename),
+            'source_lineno': match_result.source_lineno}
+
+
+class RepositoryState:
+    """ The compiled rules and the tracked files of a repository, reloaded when they change on disk.
+
+    Rules are reloaded when the modification time of the CODEOWNERS file changes, and the file list when
+    the modification time of the git index changes.
+    """
+
+    def __init__(self, repo_root: Path):
+        self.repo_root = Path(repo_root)
+        self._index_path = fs_utils.git_directory(cwd=self.repo_root) / 'index'
+        self._lock = threading.Lock()
+        self._codeowners_key = None
+        self._index_key = None
+        self._matcher = None
+        self._files = None
+
+    @staticmethod
+    def _stat_key(path: Path):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def matcher(self) -> codeowners.CompiledRuleSet:
+        """ Return the compiled rules, reloading them if the CODEOWNERS file changed.  """
+        with self._lock:
+            codeowners_path = fs_utils.codeowners_path(self.repo_root)
+            key = (codeowners_path, self._stat_key(codeowners_path))
+            if key != self._codeowners_key:
+                _logger.info('Loading rules from %s', codeowners_path)
+                with open(str(codeowners_path), 'r') as codeowners_file:
+                    rules = codeowners.parse_codeowners(codeowners_file, source_filename=codeowners_path)
+                self._matcher = codeowners.CompiledRuleSet(rules)
+                self._codeowners_key = key
+            return self._matcher
+
+    def files(self) -> typing.List[str]:
+        """ Return the tracked files, relisting them if the git index changed.  """
+        with self._lock:
+            key = self._stat_key(self._index_path)
+            if key != self._index_key or self._files is None:
+                _logger.info('Listing files of %s', self.repo_root)
+                self._files = list(fs_utils.git_output_entries(['ls-files', '-z', '--cached'], cwd=self.repo_root))
+                self._index_key = key
+            return self._files
+
+    def handle(self, request: dict) -> dict:
+        """ Return the response to a request.  """
+        if 'paths' in request:
+            matcher = self.matcher()
+            return {'results': [result_dict(path, matcher.match(path, is_dir=(self.repo_root / path).is_dir()))
+                                for path in request['paths']]}
+        if 'owner' in request:
+            rules = self.matcher().rules
+            return {'paths': [path for path, _ in codeowners.owned_files(rules, self.files(), request['owner'])]}
+        raise ValueError('Unknown request: {!r}'.format(request))
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.state.handle(json.loads(line.decode('utf-8', 'surrogateescape')))
+            except Exception as e:
+                _logger.exception('Error handling request')
+                response = {'error': str(e)}
+            self.wfile.write(json.dumps(response).encode('utf-8', 'surrogateescape') + b'\n')
+            self.wfile.flush()
+
+
+class OwnershipServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """ A server answering ownership queries about one repository, one thread per connection.  """
+    daemon_threads = True
+
+    def __init__(self, repo_root: Path, socket_path: Path):
+        self.state = RepositoryState(repo_root)
+        socket_path = Path(socket_path)
+        if socket_path.is_socket():
+            # Remove the socket left behind by a previous server.
+            socket_path.unlink()
+        super().__init__(str(socket_path), _RequestHandler)
+        self.socket_path = socket_path
+
+    def server_close(self):
+        super().server_close()
+        try:
+            self.socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def serve(repo_root: Path, socket_path: typing.Optional[Path] = None):
+    """ Answer queries about the repository at ``repo_root`` until interrupted.  """
+    socket_path = Path(socket_path) if socket_path is not None else default_socket_path(repo_root)
+    with OwnershipServer(repo_root, socket_path) as server:
+        # Load the rules eagerly, so the first query is fast too.
+        server.state.matcher()
+        server.serve_forever()
+
+
+class Client:
+    """ A connection to an ``OwnershipServer``.  """
+
+    def __init__(self, socket_path: Path):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(os.fspath(socket_path))
+        self._file = self._socket.makefile('rwb')
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def request(self, request: dict) -> dict:
+        """ Send a request, and return the response.  Raises RuntimeError if the server reports an error.  """
+        self._file.write(json.dumps(request).encode('utf-8', 'surrogateescape') + b'\n')
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError('Server closed the connection.')
+        response = json.loads(line.decode('utf-8', 'surrogateescape'))
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
+
+    def match(self, paths: typing.Iterable[str]) -> typing.List[dict]:
+        return self.request({'paths': list(map(str, paths))})['results']
+
+    def owned_files(self, owner: str) -> typing.List[str]:
+        return self.request({'owner': owner})['paths']
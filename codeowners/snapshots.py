@@ -0,0 +1,144 @@
+""" Ownership snapshots of committed git trees, updated incrementally.
+
+A snapshot records, for every file in a git tree, the line number of the CODEOWNERS rule that decides its
+owners.  To compute ownership of a commit, the snapshot of the nearest first-parent ancestor is updated
+with only the files reported by ``git diff-tree``, unless the CODEOWNERS file differs, in which case every
+file is matched again.
+"""
+from collections import namedtuple
+import gzip
+import io
+import json
+import logging
+import os
+from pathlib import Path
+import tempfile
+import typing
+
+import codeowners as _package
+from codeowners import cache, codeowners, fs_utils
+
+
+_logger = logging.getLogger(__file__)
+
+# Default bound on the total size of the snapshot directory, in bytes.
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+# Number of first-parent ancestors searched for a snapshot to start from.
+DEFAULT_MAX_ANCESTORS = 100
+
+
+class Snapshot(namedtuple('SnapshotData', 'tree, codeowners_blob, source_linenos')):
+    """ Ownership of the files in a git tree.
+
+    ``source_linenos`` maps each file path to the line number of the rule deciding its owners, or None.
+    """
+
+    def results(self, rules: typing.Iterable[codeowners.Rule]
+                ) -> typing.Iterator[typing.Tuple[str, typing.Optional[codeowners.MatchResult]]]:
+        """ Generate a pair of each path, in sorted order, and its MatchResult under ``rules``, or None.
+
+        ``rules`` must be parsed from the CODEOWNERS blob of the snapshot.
+        """
+        rules_by_lineno = {rule.source_lineno: rule for rule in rules}
+        for path in sorted(self.source_linenos):
+            lineno = self.source_linenos[path]
+            yield path, (rules_by_lineno[lineno].result(path) if lineno is not None else None)
+
+
+def snapshot_directory(cwd=None) -> Path:
+    """ Return the directory holding the snapshots of the repository containing ``cwd``.  """
+    return fs_utils.git_directory(cwd=cwd) / 'codeowners' / 'snapshots'
+
+
+def load_snapshot(tree: str, snapshot_dir: Path) -> typing.Optional[Snapshot]:
+    """ Return the stored snapshot of ``tree``, or None if there is no usable snapshot.  """
+    path = Path(snapshot_dir) / '{}.json.gz'.format(tree)
+    try:
+        with gzip.open(str(path), 'rt', encoding='utf-8', errors='surrogateescape') as snapshot_file:
+            data = json.load(snapshot_file)
+        # Snapshots record the results of matching, which may change with the code between versions.
+        if data['version'] != _package.__version__ or data.get('fingerprint') != cache.code_fingerprint():
+            return None
+        os.utime(str(path))
+        return Snapshot(tree=data['tree'], codeowners_blob=data['codeowners_blob'],
+                        source_linenos=data['source_linenos'])
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, EOFError) as e:
+        _logger.warning('Ignoring unreadable snapshot %s: %s', path, e)
+        return None
+
+
+def save_snapshot(snapshot: Snapshot, snapshot_dir: Path, max_size: int = DEFAULT_MAX_SIZE):
+    """ Store ``snapshot``, evicting the least recently used snapshots beyond ``max_size`` bytes.  """
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    data = dict(snapshot._asdict(), version=_package.__version__, fingerprint=cache.code_fingerprint())
+
+    fd, temp_name = tempfile.mkstemp(dir=str(snapshot_dir), prefix='.tmp-')
+    try:
+        with gzip.open(os.fdopen(fd, 'wb'), 'wt', encoding='utf-8', errors='surrogateescape') as snapshot_file:
+            json.dump(data, snapshot_file)
+        os.replace(temp_name, str(snapshot_dir / '{}.json.gz'.format(snapshot.tree)))
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+    cache.evict(snapshot_dir, max_size=max_size, pattern='*.json.gz')
+
+
+def revision_rules(tree: str, cwd=None, use_cache: bool = False) -> typing.Tuple[str, typing.List[codeowners.Rule]]:
+    """ Return the blob ID of the CODEOWNERS file in ``tree``, and the rules parsed from it, reusing the
+    on-disk cache of rules if ``use_cache`` is true.  """
+    codeowners_path, blob = fs_utils.codeowners_blob(tree, cwd=cwd)
+    text = fs_utils.read_blob(blob, cwd=cwd).decode('utf-8', 'surrogateescape')
+    if not use_cache:
+        return blob, codeowners.parse_codeowners(io.StringIO(text), source_filename=codeowners_path)
+    return blob, cache.cached_rules(text, source_filename=codeowners_path)
+
+
+def update_snapshot(rules: typing.Sequence[codeowners.Rule], tree: str, codeowners_blob: str,
+                    base: typing.Optional[Snapshot] = None, cwd=None) -> Snapshot:
+    """ Return the snapshot of ``tree``, whose CODEOWNERS blob is ``codeowners_blob``.
+
+    If ``base`` is the snapshot of another tree with the same CODEOWNERS blob, only the files that differ
+    between the trees are matched against ``rules``; otherwise all files are matched.
+    """
+    if base is not None and base.codeowners_blob == codeowners_blob:
+        source_linenos = dict(base.source_linenos)
+        matcher = codeowners.ScopedMatcher(rules)
+        for status, path in fs_utils.diff_tree(base.tree, tree, cwd=cwd):
+            if status == 'D':
+                source_linenos.pop(path, None)
+            else:
+                index = matcher.match_index(path)
+                source_linenos[path] = rules[index].source_lineno if index is not None else None
+    else:
+        results = codeowners.match_many(rules, fs_utils.list_tree_files(tree, cwd=cwd))
+        source_linenos = {path: result.source_lineno if result is not None else None for path, result in results}
+
+    return Snapshot(tree=tree, codeowners_blob=codeowners_blob, source_linenos=source_linenos)
+
+
+def revision_snapshot(rev: str = 'HEAD', cwd=None, snapshot_dir: typing.Optional[Path] = None,
+                      max_ancestors: int = DEFAULT_MAX_ANCESTORS, use_cache: bool = False
+                      ) -> typing.Tuple[Snapshot, typing.List[codeowners.Rule]]:
+    """ Return the snapshot of the tree of commit ``rev`` and the rules in effect in it.
+
+    The snapshot is computed from the nearest stored snapshot among the first ``max_ancestors``
+    first-parent ancestors of ``rev``, and stored for later use.  Rules are parsed as by ``revision_rules``.
+    """
+    snapshot_dir = Path(snapshot_dir) if snapshot_dir is not None else snapshot_directory(cwd=cwd)
+    tree = fs_utils.rev_parse(rev + '^{tree}', cwd=cwd)
+    codeowners_blob, rules = revision_rules(tree, cwd=cwd, use_cache=use_cache)
+
+    snapshot = load_snapshot(tree, snapshot_dir)
+    if snapshot is None or snapshot.codeowners_blob != codeowners_blob:
+        ancestor_trees = fs_utils.git_output_entries(
+            ['log', '-z', '--first-parent', '-n', str(max_ancestors), '--format=%T', rev], cwd=cwd)
+        base = next(filter(None, (load_snapshot(ancestor_tree, snapshot_dir) for ancestor_tree in ancestor_trees)),
+                    None)
+        snapshot = update_snapshot(rules, tree, codeowners_blob, base=base, cwd=cwd)
+        save_snapshot(snapshot, snapshot_dir)
+
+    return snapshot, rules
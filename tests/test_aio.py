@@ -0,0 +1,97 @@
+""" Tests for `aio` module.  """
+
+import asyncio
+from pathlib import Path
+import subprocess
+import tempfile
+
+import pytest
+
+from codeowners import aio, codeowners
+
+
+@pytest.fixture(scope='function')
+def repository_directory():
+    """Return a temporary directory, with an empty .git directory contained within."""
+    with tempfile.TemporaryDirectory(prefix='test_aio_') as temp_dir_name:
+        subprocess.run(['git', 'init', '-q'], cwd=temp_dir_name)
+        yield Path(temp_dir_name)
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+async def collect(stream):
+    items = []
+    async for item in stream:
+        items.append(item)
+    return items
+
+
+def test_async_list_files(repository_directory):
+    names = ['a.py', 'b c.txt', 'src/d.py', 'src/e.c']
+    for name in names:
+        (repository_directory / name).parent.mkdir(exist_ok=True)
+        (repository_directory / name).touch()
+    subprocess.run(['git', 'add', '--', *names], cwd=str(repository_directory))
+
+    assert run(aio.async_git_repository_root(repository_directory / 'src')) == repository_directory.resolve()
+    assert run(collect(aio.async_list_files(['.'], cwd=repository_directory))) == list(map(Path, names))
+    src_files = run(collect(aio.async_list_files(['src'], cwd=repository_directory)))
+    assert src_files == [Path('src/d.py'), Path('src/e.c')]
+
+    rules = codeowners.parse_codeowners(['*  @all', '/src/*.py  @src'], source_filename='CODEOWNERS')
+    results = run(aio.async_match_paths(rules, aio.async_list_files(['.'], cwd=repository_directory),
+                                        chunk_size=3, timeout=30))
+    assert [(str(path), result.owners) for path, result in results] == [
+        ('a.py', ['@all']), ('b c.txt', ['@all']), ('src/d.py', ['@src']), ('src/e.c', ['@all'])]
+
+    with pytest.raises(subprocess.CalledProcessError):
+        run(collect(aio.GitEntryStream(['ls-files', '--no-such-option'], cwd=repository_directory)))
+
+
+def test_async_match_paths():
+    rules = codeowners.parse_codeowners(['*  @all', '*.py  @python', 'docs/*  @docs'], source_filename='CODEOWNERS')
+    paths = ['a.py', 'b.c', 'docs/c.py', 'docs/d/e.py']
+    results = run(aio.async_match_paths(rules, paths, chunk_size=1))
+    assert results == list(codeowners.match_many(rules, paths))
+    assert run(aio.async_match_paths(rules, [])) == []
+
+
+def test_timeout_and_cancellation():
+    class SlowPaths:
+        closed = False
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            await asyncio.sleep(10)
+
+        async def aclose(self):
+            self.closed = True
+
+    rules = codeowners.parse_codeowners(['*  @all'], source_filename='CODEOWNERS')
+    paths = SlowPaths()
+    with pytest.raises(asyncio.TimeoutError):
+        run(aio.async_match_paths(rules, paths, timeout=0.05))
+    assert paths.closed
+
+    async def cancel_stream():
+        stream = aio.GitEntryStream(['-c', 'alias.slow=!exec sleep 5 >/dev/null', 'slow'])
+        task = asyncio.ensure_future(collect(stream))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return stream._process.returncode
+
+    # The running git process is killed.
+    assert run(cancel_stream()) is not None
@@ -0,0 +1,51 @@
+""" Tests for `batch` module.  """
+
+from pathlib import Path
+import subprocess
+import tempfile
+
+import pytest
+
+from codeowners import batch
+
+
+@pytest.fixture(scope='function')
+def repositories():
+    """Return a temporary directory holding repositories r1 and r2 with identical CODEOWNERS files, r3 with
+    another, and r4 without one."""
+    with tempfile.TemporaryDirectory(prefix='test_batch_') as temp_dir_name:
+        base = Path(temp_dir_name)
+        contents = {'r1': '*  @all\n*.py  @python\n', 'r2': '*  @all\n*.py  @python\n', 'r3': '*  @three\n',
+                    'r4': None}
+        for name, content in contents.items():
+            subprocess.run(['git', 'init', '-q', name], cwd=temp_dir_name)
+            (base / name / 'src').mkdir()
+            for file_name in ['a.py', 'src/b.c']:
+                (base / name / file_name).touch()
+            if content is not None:
+                (base / name / 'CODEOWNERS').write_text(content)
+            subprocess.run(['git', 'add', '--all'], cwd=str(base / name))
+        yield base
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_batch_match(repositories, jobs):
+    errors = []
+    rules_cache = batch.RulesCache(use_cache=False)
+    repo_paths = [repositories / name for name in ['r1', 'r4', 'r2', 'r3']]
+    results = batch.batch_match(repo_paths, jobs=jobs, use_cache=False, rules_cache=rules_cache,
+                                on_error=lambda repo_path, error: errors.append(repo_path))
+
+    assert [(repo_path.name, path, match_result.owners) for repo_path, path, match_result in results] == [
+        ('r1', 'CODEOWNERS', ['@all']), ('r1', 'a.py', ['@python']), ('r1', 'src/b.c', ['@all']),
+        ('r2', 'CODEOWNERS', ['@all']), ('r2', 'a.py', ['@python']), ('r2', 'src/b.c', ['@all']),
+        ('r3', 'CODEOWNERS', ['@three']), ('r3', 'a.py', ['@three']), ('r3', 'src/b.c', ['@three']),
+    ]
+    assert errors == [repositories / 'r4']
+    # The identical CODEOWNERS files of r1 and r2 are parsed once.
+    assert len(rules_cache) == 2
+
+
+def test_batch_match_errors(repositories):
+    with pytest.raises(FileNotFoundError):
+        list(batch.batch_match([repositories / 'r4'], jobs=1, use_cache=False))
@@ -0,0 +1,65 @@
+""" Tests for `cache` module.  """
+
+from pathlib import Path
+
+import pytest
+
+from codeowners import cache, codeowners
+
+
+@pytest.fixture
+def cache_dir(tmpdir):
+    return Path(str(tmpdir)) / 'cache'
+
+
+@pytest.fixture
+def codeowners_file(tmpdir):
+    path = Path(str(tmpdir)) / 'CODEOWNERS'
+    path.write_text('*.py  @python\n# Comment\ndocs/  @docs\n')
+    return path
+
+
+def test_load_rules(codeowners_file, cache_dir, monkeypatch):
+    with open(str(codeowners_file)) as f:
+        expected = codeowners.parse_codeowners(f, source_filename=codeowners_file)
+
+    rules = cache.load_rules(codeowners_file, cache_dir=cache_dir)
+    assert [(r.owners, r.source_line, r.source_lineno) for r in rules] == \
+        [(r.owners, r.source_line, r.source_lineno) for r in expected]
+    assert len(list(cache_dir.glob('*.pickle'))) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError('Cached rules should not be parsed.')
+
+    monkeypatch.setattr(codeowners, 'parse_codeowners', fail)
+    cached = cache.load_rules(codeowners_file, cache_dir=cache_dir)
+    assert codeowners.match(cached, 'a/b.py') == codeowners.match(expected, 'a/b.py')
+
+
+def test_load_rules_invalidation(codeowners_file, cache_dir):
+    cache.load_rules(codeowners_file, cache_dir=cache_dir)
+
+    codeowners_file.write_text('*.py  @other\n')
+    rules = cache.load_rules(codeowners_file, cache_dir=cache_dir)
+    assert rules[0].owners == ('@other',)
+    assert len(list(cache_dir.glob('*.pickle'))) == 2
+
+
+def test_load_rules_corrupt_entry(codeowners_file, cache_dir):
+    cache.load_rules(codeowners_file, cache_dir=cache_dir)
+    entry_path, = cache_dir.glob('*.pickle')
+    entry_path.write_bytes(b'not a pickle')
+
+    rules = cache.load_rules(codeowners_file, cache_dir=cache_dir)
+    assert rules[-1].owners == ('@python',)
+    assert cache.load_rules(codeowners_file, cache_dir=cache_dir)[-1].owners == ('@python',)
+
+
+def test_evict(codeowners_file, cache_dir):
+    for i in range(5):
+        codeowners_file.write_text('*.py  @owner{}\n'.format(i))
+        cache.load_rules(codeowners_file, cache_dir=cache_dir, max_size=0)
+        assert len(list(cache_dir.glob('*.pickle'))) == 0
+
+    cache.evict(cache_dir, max_size=0)
+    assert list(cache_dir.iterdir()) == []
@@ -0,0 +1,99 @@
+""" Tests for `cli` module.  """
+
+import multiprocessing
+import os
+from pathlib import Path
+import subprocess
+import tempfile
+
+from click.testing import CliRunner
+import pytest
+
+from codeowners import cli
+
+
+@pytest.fixture(autouse=True)
+def cache_directory(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+
+
+@pytest.fixture(scope='function')
+def repository_directory():
+    """Return a temporary git repository, with a CODEOWNERS file committed, as the working directory."""
+    with tempfile.TemporaryDirectory(prefix='test_cli_') as temp_dir_name:
+        repo = Path(temp_dir_name)
+        subprocess.run(['git', 'init', '-q'], cwd=temp_dir_name, check=True)
+        (repo / 'CODEOWNERS').write_text('*  @everyone\n*.py  @python\n')
+        for name in ['src/a.py', 'src/b.c', 'docs/index.md']:
+            (repo / name).parent.mkdir(exist_ok=True)
+            (repo / name).touch()
+        subprocess.run(['git', 'add', '-A'], cwd=temp_dir_name, check=True)
+        subprocess.run(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com', 'commit', '-q', '-m',
+                        'Commit'], cwd=temp_dir_name, check=True)
+
+        original_cwd = os.getcwd()
+        try:
+            os.chdir(temp_dir_name)
+            yield repo
+        finally:
+            os.chdir(original_cwd)
+
+
+def _invoke(*args):
+    return CliRunner().invoke(cli.main, list(args))
+
+
+def test_incremental_options(repository_directory):
+    result = _invoke('--incremental', '--owner', '@python', '--no-cache')
+    assert result.exit_code == 0, result.output
+    assert 'src/a.py: @python' in result.output and 'src/b.c' not in result.output
+    assert '@python: 1 of 4 files' in result.output
+
+    result = _invoke('--incremental', '--coverage', 'json', 'src')
+    assert result.exit_code == 0, result.output
+    assert '"path": "src"' in result.output and 'src/a.py' not in result.output
+
+    result = _invoke('--incremental', '--jobs', '2')
+    assert result.exit_code == 2
+    assert '--incremental cannot be combined with --jobs' in result.output
+
+    result = _invoke('--owner', '@python', '--rule-stats')
+    assert result.exit_code == 2
+
+
+def test_commits_paths(repository_directory):
+    (repository_directory / 'src' / 'b.c').write_text('b')
+    (repository_directory / 'docs' / 'index.md').write_text('index')
+    subprocess.run(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com', 'commit', '-q', '-a', '-m',
+                    'Change'], check=True)
+
+    result = _invoke('--commits', 'HEAD', 'docs')
+    assert result.exit_code == 0, result.output
+    assert 'docs/index.md: @everyone' in result.output and 'src/b.c' not in result.output
+
+    result = _invoke('--commits', 'HEAD', '--include-untracked', '--no-recurse')
+    assert result.exit_code == 2
+    assert '--commits cannot be combined with --include-untracked, --no-recurse' in result.output
+
+
+def test_revisions(repository_directory, tmpdir, monkeypatch):
+    (repository_directory / 'CODEOWNERS').write_text('*  @everyone\n*.c  @c\n')
+    subprocess.run(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com', 'commit', '-q', '-a', '-m',
+                    'Change'], check=True)
+
+    # The worker processes are created once for all revisions.
+    pools = []
+    pool_class = multiprocessing.Pool
+    monkeypatch.setattr(multiprocessing, 'Pool', lambda *args, **kwargs: pools.append(args) or
+                        pool_class(*args, **kwargs))
+    result = _invoke('--rev', 'HEAD~1', '--rev', 'HEAD', '--jobs', '2', '--no-cache', '--owner', '@everyone', 'src')
+    assert result.exit_code == 0, result.output
+    assert 'HEAD~1:src/b.c: @everyone' in result.output and 'HEAD:src/a.py: @everyone' in result.output
+    assert 'src/a.py: @python' not in result.output and 'docs' not in result.output
+    assert '@everyone: 2 of 4 files' in result.output
+    assert len(pools) == 1
+    assert not tmpdir.join('codeowners').check()
+
+    result = _invoke('--rev', 'HEAD', '--coverage', 'table')
+    assert result.exit_code == 2
+    assert '--rev cannot be combined with --coverage' in result.output
@@ -1,6 +1,10 @@
 """ Tests for `codeowners` module.  """
 
+import fnmatch
 from pathlib import PurePath
+import re
+import time
+import warnings
 
 import pytest
 
@@ -71,6 +75,55 @@ def test_pattern_match_recursive():
     assert not rec_pat.match('a/x/y/z/c')
 
 
+def test_pattern_match_recursive_trailing():
+    pat = codeowners.parse_pattern('a/**')
+    assert pat.match('a/b')
+    assert pat.match('a/x/y/z')
+    # A trailing '**' matches the contents of the directory, not the directory itself.
+    assert not pat.match('a', is_dir=True)
+    assert not pat.match('b/a/c')
+    assert pat.subtree_match(('a',)) is True
+    assert pat.subtree_match(('b',)) is False
+
+    assert codeowners.parse_pattern('**').match('a')
+    assert codeowners.parse_pattern('**/b/**').match('x/y/b/c')
+    assert not codeowners.parse_pattern('**/b/**').match('x/y/b')
+
+
+def test_pattern_match_recursive_rooted():
+    pat = codeowners.parse_pattern('/docs/**/*.md')
+    assert pat.match('docs/index.md')
+    assert pat.match('docs/a/b/index.md')
+    assert not pat.match('src/docs/index.md')
+
+
+def test_pattern_match_recursive_deep_path():
+    # Many '**' components against a deep path that almost matches would backtrack catastrophically in a regex.
+    pat = codeowners.parse_pattern('**/a/**/a/**/a/**/a/**/a/**/a/**/b')
+    assert not pat.match('/'.join(['a'] * 500))
+    assert pat.match('/'.join(['a'] * 500 + ['b']))
+    with pytest.raises(ValueError):
+        pat.as_regex()
+
+
+def test_pattern_compile_concurrent(monkeypatch):
+    # Evaluate the pattern in the middle of its compilation, as another thread sharing it could.
+    pat = codeowners.parse_pattern('a/**/b')
+    results = []
+    compile_segments = codeowners._compile_segments
+
+    def compile_segments_and_evaluate(parts):
+        if not results:
+            results.append(None)
+            results.append((pat.subtree_match(('a', 'x', 'y')), pat.match('a/x/b')))
+        return compile_segments(parts)
+
+    monkeypatch.setattr(codeowners, '_compile_segments', compile_segments_and_evaluate)
+    assert pat.match('a/b')
+    assert results[-1] == (None, True)
+    assert pat.subtree_match(('a', 'x', 'y')) is None
+
+
 def test_pattern_match_trailing_spaces():
     pat = codeowners.parse_pattern('a/b ')
     assert pat.match('a/b ')
@@ -155,3 +208,246 @@ def test_parse_codeowners_escaped_spaces():
     assert result2.owners == ['@owner2']
 
     assert codeowners.match(rules, 'ab') is None
+
+
+def test_tokenize_line():
+    assert codeowners.tokenize_line('*.py  @a @b') == ['*.py', '@a', '@b']
+    assert codeowners.tokenize_line(r'a\ b\#c  @a') == ['a b#c', '@a']
+    assert codeowners.tokenize_line('a#b  @a  # Comment @b') == ['a#b', '@a']
+    assert codeowners.tokenize_line(r'\#file  @a#b') == ['#file', '@a#b']
+    assert codeowners.tokenize_line('"a b"  @a') == ['"a', 'b"', '@a']
+    assert codeowners.tokenize_line('  # Comment') == []
+    assert codeowners.tokenize_line(r'a\\b') == ['a\\b']
+    assert codeowners.tokenize_line('ab\\ \n') == ['ab ']
+    with pytest.raises(codeowners.ParseError):
+        codeowners.tokenize_line('ab\\\n')
+
+
+def test_parse_codeowners_errors():
+    with pytest.raises(codeowners.ParseError) as excinfo:
+        codeowners.parse_codeowners(['*  @a', '', 'docs/*  @b\\'], source_filename='CODEOWNERS')
+    assert (excinfo.value.lineno, excinfo.value.column) == (3, 11)
+    assert str(excinfo.value) == 'CODEOWNERS:3:11: Backslash at end of line'
+
+    with pytest.raises(codeowners.ParseError) as excinfo:
+        codeowners.parse_codeowners(['*  @a', '  src/a**/b  @b'], source_filename='CODEOWNERS')
+    assert (excinfo.value.lineno, excinfo.value.column) == (2, 3)
+    # Parse errors are ValueErrors.
+    with pytest.raises(ValueError):
+        codeowners.parse_codeowners(['!  @a'], source_filename='CODEOWNERS')
+
+
+def test_lazy_compilation():
+    rules = codeowners.parse_codeowners(['*  @all', '*.py  @python', 'src/**/*.c  @c'], source_filename='CODEOWNERS')
+    assert all(rule.pattern._part_matchers is None for rule in rules)
+    assert rules[2].pattern.recursive is False and rules[0].pattern.recursive is True
+
+    assert codeowners.match(rules, 'a.py').owners == ['@python']
+    assert [rule.pattern._part_matchers is not None for rule in rules] == [True, True, False]
+    assert rules[2].pattern.subtree_match(('src',)) is True
+
+
+SAMPLE_LINES = ['*                @everyone',
+                '*.py             @python',
+                '/docs/           @docs',
+                'docs/*.md        @writers',
+                'src/**/test_*    @testers',
+                '/build           @build',
+                '!src/*.c         @not_c',
+                'bin/             @bin',
+                'lib/[a-c]*.h     @headers',
+                'data?            @data',
+                'vendor           @vendor']
+
+SAMPLE_PATHS = ['file.txt', 'file.py', 'docs', 'docs/index.md', 'docs/a/b.md', 'x/docs/index.md',
+                'src/test_a.py', 'src/a/b/test_b.c', 'src/main.c', 'src/main.h', 'build/out.o', 'x/build',
+                'bin', 'x/bin', 'lib/a.h', 'lib/d.h', 'lib/b/c.h', 'data1', 'x/dataz/y', 'data12',
+                'vendor', 'x/vendor/y.py', 'vendors/y.py']
+
+
+@pytest.mark.parametrize('matcher_class', [codeowners.CompiledRuleSet, codeowners.RuleIndex,
+                                           codeowners.ScopedMatcher])
+def test_rule_matchers(matcher_class):
+    rules = codeowners.parse_codeowners(SAMPLE_LINES, source_filename='CODEOWNERS')
+    matcher = matcher_class(rules)
+
+    for path in SAMPLE_PATHS:
+        for is_dir in (False, True):
+            assert matcher.match(path, is_dir=is_dir) == codeowners.match(rules, path, is_dir=is_dir), path
+
+    assert matcher.match('src/main.h').owners == ['@not_c']
+    assert matcher.match('bin', is_dir=True).owners == ['@bin']
+    assert matcher_class([]).match('a') is None
+
+
+def test_rule_index_candidates():
+    rules = codeowners.parse_codeowners(SAMPLE_LINES, source_filename='CODEOWNERS')
+    index = codeowners.RuleIndex(rules)
+
+    # Rules are reversed, so the last line of SAMPLE_LINES is at index 0.
+    candidate_lines = [rules[i].source_lineno for i in index.candidates('docs/api/index.md')]
+    assert candidate_lines == [10, 7, 4, 3, 2, 1]
+    assert [rules[i].source_lineno for i in index.candidates('x/vendor/y.py')] == [11, 10, 7, 2, 1]
+
+
+def test_match_many():
+    rules = codeowners.parse_codeowners(SAMPLE_LINES, source_filename='CODEOWNERS')
+    paths = sorted(SAMPLE_PATHS) + SAMPLE_PATHS
+
+    results = list(codeowners.match_many(rules, paths))
+    assert [path for path, _ in results] == paths
+    assert [result for _, result in results] == [codeowners.match(rules, p) for p in paths]
+
+    dirs = {'bin', 'x/bin'}
+    results = list(codeowners.match_many(rules, paths, is_dir=lambda p: p in dirs))
+    assert [result for _, result in results] == [codeowners.match(rules, p, is_dir=p in dirs) for p in paths]
+
+
+def test_directory_scope():
+    rules = codeowners.parse_codeowners(['*  @everyone', '/docs/ @docs', 'docs/* @writers', '*.py @python'],
+                                        source_filename='CODEOWNERS')
+    root = codeowners.DirectoryScope.root(rules)
+    # The '*' rule matches every file, so it is the fallback, and no rule preceding it can be decided.
+    assert [rules[i].source_lineno for i in root.candidates] == [4, 3]
+    assert rules[root.fallback].source_lineno == 1
+
+    docs = root.child(rules, 'docs')
+    assert [rules[i].source_lineno for i in docs.candidates] == [4]
+    assert rules[docs.fallback].source_lineno == 3
+    assert [rules[i].source_lineno for i in root.child(rules, 'src').candidates] == [4]
+
+
+def test_scoped_matcher_unscoped_rules():
+    # Rules of a single component or starting with '**' apply below every directory; a repeated pattern never
+    # decides ownership.
+    rules = codeowners.parse_codeowners(['*.py @python', '**/gen/*.c @gen', 'lib/ @lib', '**/*.md @docs',
+                                         '!docs/x.md', '*.py @python2', 'gen @gen-dir'], 'CODEOWNERS')
+    paths = ['a.py', 'gen/a.c', 'gen/gen/a.c', 'lib/a.c', 'lib/gen/a.c', 'lib/gen/b/a.c', 'lib/x.md',
+             'docs/x.md', 'docs/y.md', 'src/gen.py', 'src/gen/a.c', 'src/gen/a.py', 'src/a.c']
+    assert list(codeowners.match_many(rules, paths)) == [(path, codeowners.match(rules, path)) for path in paths]
+    matcher = codeowners.ScopedMatcher(rules)
+    assert [matcher.match(path) for path in reversed(paths)] == [codeowners.match(rules, p) for p in reversed(paths)]
+
+
+def test_fixed_subtrees():
+    rules = codeowners.parse_codeowners(['*  @everyone', '*.py @python', '/third_party @vendor', '/src @src',
+                                         'src/**/generated/*.c @gen'], source_filename='CODEOWNERS')
+    matcher = codeowners.ScopedMatcher(rules)
+    assert rules[matcher.fixed_scope(('third_party', 'lib')).fallback].source_lineno == 3
+    assert matcher.fixed_scope(('third_party', 'lib')).dir_parts == ('third_party',)
+    # Rules that can reach inside, by a suffix or a '**' component, keep ownership of a subtree open.
+    assert matcher.fixed_scope(('src',)) is None
+    assert matcher.fixed_scope(('docs',)) is None
+    unanchored = codeowners.parse_codeowners(['/third_party @vendor', '**/generated/*.c @gen'], 'CODEOWNERS')
+    assert codeowners.ScopedMatcher(unanchored).fixed_scope(('third_party',)) is None
+
+    paths = ['docs/a.py', 'docs/b.c', 'src/a.py', 'src/generated/b.c', 'src/generated/c.py', 'third_party/a.py',
+             'third_party/lib/b.c', 'third_party/lib/generated/c.c', 'third_party/z.c', 'third_party_notes']
+    expected = [(path, codeowners.match(rules, path)) for path in paths]
+    assert list(codeowners.match_many(rules, paths)) == expected
+    assert [path for path, index in matcher.match_indices([('third_party', True)])] == ['third_party']
+
+    # Files of a fixed subtree after the first are assigned without looking up their scope, as strings or paths.
+    for path_type in [str, PurePath]:
+        matcher = codeowners.ScopedMatcher(rules)
+        scope_calls = []
+        scope = matcher.scope
+        matcher.scope = lambda dir_parts: scope_calls.append(dir_parts) or scope(dir_parts)
+        items = [(path_type(path), False) for path in paths[5:]]
+        assert [(str(path), rules[index].source_lineno) for path, index in matcher.match_indices(items)] == [
+            (path, match_result.source_lineno) for path, match_result in expected[5:]]
+        assert scope_calls == [('third_party',), ()]
+
+
+def test_owner_index():
+    rules = codeowners.parse_codeowners(['* @a', '*.py @a @b', '*.py @b'], source_filename='CODEOWNERS')
+    assert codeowners.owner_index(rules) == {'@a': [1, 2], '@b': [0, 1]}
+
+
+def test_owned_files():
+    rules = codeowners.parse_codeowners(SAMPLE_LINES, source_filename='CODEOWNERS')
+    paths = sorted(SAMPLE_PATHS)
+
+    for owner in ['@everyone', '@python', '@writers', '@not_c', '@bin', '@vendor', '@nobody']:
+        expected = [(p, r) for p, r in codeowners.match_many(rules, paths) if r is not None and owner in r.owners]
+        assert list(codeowners.owned_files(rules, paths, owner)) == expected, owner
+
+
+def test_split_path():
+    for path in ['a/b/c', 'a//b/', './a/./b', '.', '', 'a/../b', '/a/b', 'a b/c']:
+        assert codeowners.split_path(path) == PurePath(path).parts, path
+    assert codeowners.split_path(PurePath('a/b')) == ('a', 'b')
+
+
+def test_pattern_match_parts():
+    pat = codeowners.parse_pattern('/a/**/c')
+    assert pat.match_parts(('a', 'b', 'c'))
+    assert not pat.match_parts(('x', 'a', 'c'))
+    assert codeowners.parse_pattern('/a').match_parts(('a', 'b'))
+    assert not codeowners.parse_pattern('/a').match_parts(('b', 'a'))
+
+
+def test_compile_glob():
+    names = ['a.py', 'b.py', '.py', 'a', 'abc', 'cab', 'a.pyc', 'x[1]', '*.py', 'doc?', 'z', '[', '&', '-', '!',
+             '^', '\\', 'abab', 'aabcc', 'a.b.c', 'bcabc', 'abcabc']
+    globs = ['a.py', '*.py', 'a*', '*', '**', '?', '[ab]*', '*a*', 'a?c', '[!a]*', 'x[1]', 'doc?',
+             # Empty ranges, nested sets, set operations, and escapes, which must neither fail nor warn.
+             '[z-a]*', 'lib/[z-a]*', '[a-z-]', '[!z-a]', '[a-]', '[-a]', '[!]', '[!]]', '[[a]', '[a[]', '[a&&b]',
+             '[a||b]', '[a~~b]', '[a--z]', '[^a]', '[\\]', '[a-\\]', '[!-]',
+             # Several '*', whose fixed text between them is matched at its earliest position.
+             '*a*b', '*b*a*', 'a*b*c', '*a?c*', '*[ab]*c', '*.*.*', '*a*a*', '?*b*?']
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        for glob in globs:
+            matcher = codeowners.compile_glob(glob)
+            for name in names:
+                assert bool(matcher(name)) == fnmatch.fnmatchcase(name, glob), (glob, name)
+
+
+def test_match_long_component():
+    # Globs of several '*' would backtrack polynomially in the length of a component that almost matches.
+    component = 'a' * 5000
+    rules = codeowners.parse_codeowners(['*  @all', '*a*a*a*b  @b', 'x/*a*a*a*b*/  @c', '**/x/**/*a*a*a*b  @d'],
+                                        source_filename='CODEOWNERS')
+    start = time.perf_counter()
+    for path in [component, 'x/' + component, 'y/x/' + component + '/z']:
+        for is_dir in [False, True]:
+            assert codeowners.match(rules, path, is_dir=is_dir).owners == ['@all']
+            assert codeowners.CompiledRuleSet(rules).match(path, is_dir=is_dir).owners == ['@all']
+    assert codeowners.match(rules, 'y/x/' + component + 'b').owners == ['@d']
+    assert time.perf_counter() - start < 1
+
+
+def test_translate_glob():
+    assert re.fullmatch(codeowners.translate_glob('*.py'), 'a.py')
+    assert not re.fullmatch(codeowners.translate_glob('*.py'), 'a/b.py')
+    assert not re.fullmatch(codeowners.translate_glob('[!a]'), '/')
+    assert re.fullmatch(codeowners.translate_glob('a+[b'), 'a+[b')
+
+
+def test_compact_results():
+    rules = codeowners.parse_codeowners(['*  @all', '*.py  @python', 'docs/  @docs', '/src/*.c  @all', '/x  @x'],
+                                        source_filename='CODEOWNERS')
+    paths = ['a.py', 'b.c', 'docs', 'src/a.c', 'src/b.py', 'x/y', 'z']
+
+    def is_dir(path):
+        return path == 'docs'
+
+    results = codeowners.CompactResults.from_paths(rules[1:], paths, is_dir=is_dir)
+    assert list(results) == list(codeowners.match_many(rules[1:], paths, is_dir=is_dir))
+    assert len(results) == len(paths)
+    assert results[3] == ('src/a.c', rules[1].result('src/a.c'))
+    assert results.owners(2) == ('@docs',) and results.owners(3) is results.owners(1)
+
+    results = codeowners.CompactResults(rules[1:])
+    results.append('a/b', None)
+    assert results[0] == ('a/b', None) and results.rule_index(0) is None and results.owners(0) is None
+
+    # Rules with the same owners share them, as a tuple, and each result has its own list of them.
+    assert rules[1].owners is rules[4].owners and rules[1].owners == ('@all',)
+    result = rules[1].result('a')
+    result.owners.append('@other')
+    assert rules[4].owners == ('@all',) and rules[4].result('b').owners == ['@all']
+    # No rule or result has an instance dictionary.
+    for value in [rules[0], rules[0].pattern, rules[0].result('x')]:
+        assert not hasattr(value, '__dict__')
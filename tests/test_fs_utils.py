@@ -5,7 +5,7 @@ import subprocess
 
 import pytest
 
-from codeowners import fs_utils
+from codeowners import codeowners, fs_utils
 
 
 @pytest.fixture(scope='function')
@@ -88,3 +88,83 @@ def test_list_files(repository_directory):
 
     assert sorted(fs_utils.list_files([repository_directory], untracked=True)) == [Path('a'), Path('b')]
     assert sorted(fs_utils.list_files([repository_directory], untracked=False)) == [Path('a')]
+
+
+def test_list_files_unusual_names(repository_directory):
+    names = ['with space', 'with\nnewline', 'quoted"name', 'tab\tname', 'ünïcode']
+    for name in names:
+        (repository_directory / name).touch()
+    subprocess.run(['git', 'add', '--', *names])
+
+    assert sorted(fs_utils.list_files([repository_directory])) == sorted(Path(name) for name in names)
+
+
+def test_git_output_entries_failure(repository_directory):
+    with pytest.raises(subprocess.CalledProcessError):
+        list(fs_utils.git_output_entries(['ls-files', '--error-unmatch', 'missing']))
+
+
+def test_changed_files(repository_directory):
+    def commit(*names):
+        for name in names:
+            with open(str(repository_directory / name), 'a') as f:
+                f.write(name)
+        subprocess.run(['git', 'add', '--', *names])
+        subprocess.run(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com', 'commit', '-q', '-m', 'x'])
+
+    commit('a', 'b')
+    commit('b', 'c')
+    commit('c', 'd')
+
+    assert list(fs_utils.changed_files('HEAD')) == ['c', 'd']
+    assert list(fs_utils.changed_files('HEAD~2..HEAD')) == ['c', 'd', 'b']
+    assert sorted(fs_utils.changed_files('HEAD~2')) == ['a', 'b']
+
+    # A merge commit changes the files that differ from its first parent.
+    subprocess.run(['git', 'checkout', '-q', '-b', 'feature', 'HEAD~1'])
+    commit('e')
+    subprocess.run(['git', 'checkout', '-q', '-'])
+    subprocess.run(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com', 'merge', '-q', '--no-ff',
+                    '-m', 'Merge', 'feature'])
+    assert list(fs_utils.changed_files('HEAD')) == ['e']
+
+
+def test_blob_reader(repository_directory):
+    def commit():
+        subprocess.run(['git', 'add', '--all'])
+        subprocess.run(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com', 'commit', '-q', '-m', 'x'])
+
+    (repository_directory / '.github').mkdir()
+    (repository_directory / '.github' / 'CODEOWNERS').write_bytes(b'*  @old\n')
+    (repository_directory / 'empty').write_bytes(b'')
+    commit()
+    (repository_directory / '.github' / 'CODEOWNERS').unlink()
+    (repository_directory / 'CODEOWNERS').write_bytes(b'*  @new\n')
+    commit()
+
+    with fs_utils.BlobReader() as reader:
+        assert reader.read('HEAD:empty') == b''
+        assert reader.read('HEAD:missing') is None
+        # Trees are not blobs.
+        assert reader.read('HEAD~1:.github') is None
+        assert fs_utils.read_codeowners('HEAD~1', reader) == (Path('.github/CODEOWNERS'), b'*  @old\n')
+        assert fs_utils.read_codeowners('HEAD', reader) == (Path('CODEOWNERS'), b'*  @new\n')
+
+
+def test_walk_ownership(repository_directory):
+    for name in ['README', 'src/a.py', 'src/b.c', 'third_party/lib/a.py', 'third_party/lib/b.c']:
+        path = repository_directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+    rules = codeowners.parse_codeowners(['*  @everyone', '*.py  @python', '/third_party  @vendor'],
+                                        source_filename='CODEOWNERS')
+
+    entries = [(entry.path, entry.match_result.owners, entry.subtree)
+               for entry in fs_utils.walk_ownership(rules, repository_directory)]
+    assert entries == [('README', ['@everyone'], False),
+                       ('src/a.py', ['@python'], False),
+                       ('src/b.c', ['@everyone'], False),
+                       ('third_party', ['@vendor'], True)]
+
+    entries = list(fs_utils.walk_ownership(rules[1:], repository_directory))
+    assert entries[-1].path == 'third_party/lib/b.c' and not entries[-1].subtree
@@ -0,0 +1,61 @@
+""" Tests for `impact` module.  """
+
+import random
+
+from codeowners import codeowners, impact
+
+
+OLD_LINES = ['*  @all', '*.py  @python', 'docs/*  @docs', '/src/core/  @core', 'build/  @build']
+
+
+def test_rule_changes():
+    new_lines = ['*  @all', 'build/  @build', '*.py  @python', 'docs/*  @writers', '/src/core/  @core', '*.md  @docs']
+    old_rules = codeowners.parse_codeowners(OLD_LINES, source_filename='old')
+    new_rules = codeowners.parse_codeowners(new_lines, source_filename='new')
+
+    changes = impact.rule_changes(old_rules, new_rules)
+    summary = {(change.kind, change.old_rule and change.old_rule.source_lineno,
+                change.new_rule and change.new_rule.source_lineno) for change in changes}
+    assert summary == {('moved', 5, 2), ('removed', 3, None), ('added', None, 4), ('added', None, 6)}
+    assert impact.rule_changes(old_rules, codeowners.parse_codeowners(OLD_LINES, source_filename='new')) == []
+
+
+def test_ownership_changes():
+    new_lines = ['*  @all', '*.py  @python', 'docs/*  @writers', '/src/core/  @core', 'build/  @build',
+                 '/src/*.py  @src']
+    old_rules = codeowners.parse_codeowners(OLD_LINES, source_filename='old')
+    new_rules = codeowners.parse_codeowners(new_lines, source_filename='new')
+    paths = ['README', 'docs/index.md', 'docs/conf.py', 'src/a.py', 'src/a.c', 'src/core/b.py', 'tests/a.py']
+
+    changes = list(impact.ownership_changes(old_rules, new_rules, paths))
+    assert [change.summary() for change in changes] == [
+        'docs/index.md: @docs -> @writers', 'docs/conf.py: @docs -> @writers', 'src/a.py: @python -> @src']
+    assert changes[2].as_dict() == {'path': 'src/a.py', 'old_owners': ['@python'], 'old_source_lineno': 2,
+                                    'new_owners': ['@src'], 'new_source_lineno': 6}
+
+    # Removing the only rule matching a file leaves it without owners.
+    changes = list(impact.ownership_changes(old_rules, old_rules[:-1], paths))
+    assert [change.summary() for change in changes] == ['README: @all -> <NONE>', 'src/a.c: @all -> <NONE>']
+
+
+def test_ownership_changes_agree_with_full_match():
+    rng = random.Random(0)
+    patterns = ['*', '*.py', 'a/', '/a/b/', 'b/*.c', '**/c', '/a/**/d.py', 'c/*', '!a/b/*.py', '/b']
+    paths = sorted('/'.join(rng.choice('abcd') for _ in range(rng.randint(1, 4))) + rng.choice(['', '.py', '.c'])
+                   for _ in range(300))
+
+    for _ in range(50):
+        old_lines = ['{}  @{}'.format(rng.choice(patterns), rng.randint(1, 3)) for _ in range(6)]
+        new_lines = list(old_lines)
+        for _ in range(rng.randint(1, 3)):
+            new_lines.insert(rng.randrange(len(new_lines) + 1), new_lines.pop(rng.randrange(len(new_lines))))
+            new_lines[rng.randrange(len(new_lines))] = '{}  @{}'.format(rng.choice(patterns), rng.randint(1, 3))
+        old_rules = codeowners.parse_codeowners(old_lines, source_filename='old')
+        new_rules = codeowners.parse_codeowners(new_lines, source_filename='new')
+
+        expected = []
+        for path in paths:
+            old_result, new_result = codeowners.match(old_rules, path), codeowners.match(new_rules, path)
+            if (old_result and old_result.owners) != (new_result and new_result.owners):
+                expected.append(path)
+        assert [change.path for change in impact.ownership_changes(old_rules, new_rules, paths)] == expected
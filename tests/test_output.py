@@ -0,0 +1,74 @@
+""" Tests for `output` module.  """
+
+import csv
+import io
+import json
+
+import pytest
+
+from codeowners import codeowners, output
+
+
+@pytest.fixture
+def results():
+    rules = codeowners.parse_codeowners(['*.py  @python @org/team'], source_filename='CODEOWNERS')
+    return list(codeowners.match_many(rules, ['a, b.py', 'README']))
+
+
+def write(results, output_format):
+    text = io.StringIO()
+    assert output.write_results(iter(results), output_format, text) == len(results)
+    return text.getvalue()
+
+
+def test_text(results):
+    assert write(results, 'text') == 'a, b.py: @python @org/team\nREADME: <NONE>\n'
+
+
+def test_json(results):
+    records = [{'path': 'a, b.py', 'owners': ['@python', '@org/team'], 'source_filename': 'CODEOWNERS',
+                'source_lineno': 1},
+               {'path': 'README', 'owners': None, 'source_filename': None, 'source_lineno': None}]
+    assert json.loads(write(results, 'json')) == records
+    assert json.loads(write([], 'json')) == []
+    assert [json.loads(line) for line in write(results, 'jsonl').splitlines()] == records
+
+
+def test_csv(results):
+    rows = list(csv.reader(io.StringIO(write(results, 'csv'))))
+    assert rows == [output.CSV_FIELDS, ['a, b.py', '@python @org/team', 'CODEOWNERS', '1'], ['README', '', '', '']]
+
+
+def test_nul(results):
+    assert write(results, 'nul').split('\0') == ['a, b.py', '@python @org/team', 'CODEOWNERS', '1',
+                                                 'README', '', '', '', '']
+
+
+def test_unknown_format(results):
+    with pytest.raises(ValueError):
+        write(results, 'xml')
+
+
+def test_buffered_output():
+    stream = io.BytesIO()
+    with output.BufferedOutput(stream, buffer_size=4) as buffered:
+        buffered.write('ab')
+        assert stream.getvalue() == b''
+        buffered.write('c\udcff')
+        assert stream.getvalue() == b'abc\xff'
+        buffered.write('d')
+    assert stream.getvalue() == b'abc\xffd'
+
+
+def test_extra_fields(results):
+    text = io.StringIO()
+    writer = output.ResultWriter('jsonl', text, extra_fields=['rev'])
+    for path, match_result in results:
+        writer.write(path, match_result, ['v1.0'])
+    writer.close()
+    assert [json.loads(line)['rev'] for line in text.getvalue().splitlines()] == ['v1.0', 'v1.0']
+
+    text = io.StringIO()
+    writer = output.ResultWriter('text', text, extra_fields=['rev'])
+    writer.write(*results[1], extra_values=['v1.0'])
+    assert text.getvalue() == 'v1.0:README: <NONE>\n'
@@ -0,0 +1,39 @@
+""" Tests for `parallel` module.  """
+
+import io
+
+from codeowners import batch, cache, codeowners, parallel
+
+
+def test_match_parallel():
+    lines = ['*          @everyone',
+             '*.py       @python',
+             '/docs/     @docs',
+             'docs/*.md  @writers',
+             'src/**/x   @x']
+    rules = codeowners.parse_codeowners(lines, source_filename='CODEOWNERS')
+    paths = ['{}/{}/{}'.format(top, i, name) for top in ('docs', 'src', 'lib') for i in range(50)
+             for name in ('x', 'a.py', 'b.md')]
+    expected = list(codeowners.match_many(rules, paths))
+
+    assert list(parallel.match_parallel(rules, paths, jobs=2, chunk_size=7)) == expected
+    assert list(parallel.match_parallel(rules, paths, jobs=1)) == expected
+    assert list(parallel.match_parallel(rules, [], jobs=2)) == []
+
+    dirs = set(paths[::3])
+    assert (list(parallel.match_parallel(rules, paths, jobs=2, is_dir=dirs.__contains__)) ==
+            list(codeowners.match_many(rules, paths, is_dir=dirs.__contains__)))
+
+
+def test_match_pool():
+    texts = ['*  @everyone\n*.py  @python\n', '*  @everyone\ndocs/  @docs\n']
+    sources = [batch.RepositoryRules(None, cache.content_key(text, 'CODEOWNERS'), text, 'CODEOWNERS')
+               for text in texts]
+    paths = ['{}/{}/{}'.format(top, i, name) for top in ('docs', 'src') for i in range(20) for name in ('a.py', 'b.md')]
+
+    for jobs in [1, 2]:
+        with parallel.MatchPool(jobs=jobs, use_cache=False, chunk_size=7) as pool:
+            for source in sources * 2:
+                rules = codeowners.parse_codeowners(io.StringIO(source.text), source_filename='CODEOWNERS')
+                assert list(pool.match(source, paths)) == list(codeowners.match_many(rules, paths))
+            assert len(pool.rules_cache) == 2
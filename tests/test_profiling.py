@@ -0,0 +1,55 @@
+""" Tests for `profiling` module.  """
+
+import json
+
+import pytest
+
+from codeowners import codeowners, profiling
+
+
+def test_profile_rules():
+    rules = codeowners.parse_codeowners(['*  @all', '*.py  @python', 'docs/  @docs'], source_filename='CODEOWNERS')
+    paths = ['a.py', 'b.c', 'src/c.py']
+
+    with profiling.profile() as profiler:
+        profiling.observe_rules(rules)
+        results = [codeowners.match(rules, path) for path in paths]
+
+    assert [result.owners for result in results] == [['@python'], ['@all'], ['@python']]
+    profiles = {profile.rule.source_lineno: profile for profile in profiler.rule_profiles()}
+    assert (profiles[2].evaluations, profiles[2].hits) == (3, 2)
+    assert (profiles[1].evaluations, profiles[1].hits, profiles[1].misses) == (1, 1, 0)
+    assert profiles[3].evaluations == 3 and profiles[3].hit_ratio == 0.0
+    assert all(profile.seconds >= 0 for profile in profiles.values())
+
+    data = profiler.as_dict()
+    assert json.loads(json.dumps(data)) == data
+    assert {entry['source_lineno'] for entry in data['rules']} == {1, 2, 3}
+
+
+def test_profile_disabled():
+    match_parts = codeowners.Pattern.match_parts
+    with profiling.profile() as profiler:
+        assert codeowners.Pattern.match_parts is not match_parts
+        with pytest.raises(RuntimeError):
+            with profiling.profile():
+                pass
+    assert codeowners.Pattern.match_parts is match_parts
+
+    # Without an active profile, iterables are returned unchanged, and nothing is recorded.
+    paths = ['a', 'b']
+    assert profiling.iterate('match', paths) is paths
+    with profiling.phase('match'):
+        codeowners.parse_pattern('a').match('a')
+    assert profiler.phase_seconds == {}
+
+
+def test_profile_phases():
+    with profiling.profile() as profiler:
+        with profiling.phase('output'):
+            items = list(profiling.iterate('list_files', range(3)))
+
+    assert items == [0, 1, 2]
+    assert set(profiler.phase_seconds) == {'output', 'list_files'}
+    lines = list(profiling.format_report(profiler))
+    assert lines[0].split() == ['PHASE', 'SECONDS']
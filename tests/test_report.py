@@ -0,0 +1,58 @@
+""" Tests for `report` module.  """
+
+import json
+
+from codeowners import codeowners, report
+
+
+def test_directory_coverage():
+    rules = codeowners.parse_codeowners(['/src/  @src', 'src/*.py  @python', 'docs/**/*.md  @docs'],
+                                        source_filename='CODEOWNERS')
+    paths = ['README', 'docs/a/b.md', 'docs/a/c.txt', 'docs/d.md', 'src/a.py', 'src/b.c', 'src/sub/c.py']
+    coverages = list(report.directory_coverage(codeowners.match_many(rules, paths)))
+
+    assert [(c.path, c.file_count, c.owned_count, len(c.owner_sets)) for c in coverages] == [
+        ('docs/a', 2, 1, 1),
+        ('docs', 3, 2, 1),
+        ('src/sub', 1, 0, 0),
+        ('src', 3, 1, 1),
+        ('.', 7, 3, 2),
+    ]
+    assert coverages[-1].unowned_count == 4
+
+    shallow = list(report.directory_coverage(codeowners.match_many(rules, paths), max_depth=1))
+    assert [c.path for c in shallow] == ['docs', 'src', '.']
+    assert shallow[-1] == coverages[-1]
+
+
+def test_format():
+    coverages = [report.DirectoryCoverage('src', 4, 3, frozenset([('@a',), ('@a', '@b')]))]
+    table = list(report.format_table(coverages))
+    assert table[1].split() == ['4', '3', '1', '75.0%', '2', 'src']
+
+    data = json.loads('\n'.join(report.format_json(coverages)))
+    assert data == [{'path': 'src', 'files': 4, 'owned': 3, 'unowned': 1, 'owned_fraction': 0.75, 'owner_sets': 2}]
+    assert json.loads('\n'.join(report.format_json([]))) == []
+
+
+def test_rule_stats():
+    lines = ['*            @everyone',
+             '*.py         @python',
+             '/docs/a/*.md @a',
+             'docs/a/b.md  @b',
+             '/docs/       @docs',
+             'docs/*       @docs',
+             'src/*.py     @src',
+             '*.py         @python2']
+    rules = codeowners.parse_codeowners(lines, source_filename='CODEOWNERS')
+    paths = ['README', 'docs/a/b.md', 'docs/c.md', 'src/x.py']
+    stats = report.rule_stats(rules, codeowners.match_many(rules, paths))
+
+    assert [s.rule.source_lineno for s in stats] == list(range(1, 9))
+    assert [s.win_count for s in stats] == [1, 0, 0, 0, 0, 2, 0, 1]
+    assert [s.shadowed_by.source_lineno if s.shadowed_by else None for s in stats] == \
+        [None, 8, 6, 6, None, None, None, None]
+
+    table = list(report.format_rule_stats(stats))
+    assert table[1].split() == ['1', 'CODEOWNERS:1']
+    assert table[2].split() == ['0', 'CODEOWNERS:2', 'never', 'wins;', 'shadowed', 'by', 'line', '8']
@@ -0,0 +1,67 @@
+""" Tests for `server` module.  """
+
+import os
+from pathlib import Path
+import subprocess
+import tempfile
+import threading
+
+import pytest
+
+from codeowners import server
+
+
+@pytest.fixture(autouse=True)
+def cache_directory(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+
+
+@pytest.fixture(scope='function')
+def repository_directory():
+    """Return a temporary git repository, with a CODEOWNERS file and tracked files."""
+    with tempfile.TemporaryDirectory(prefix='test_server_') as temp_dir_name:
+        repo = Path(temp_dir_name)
+        subprocess.run(['git', 'init', '-q'], cwd=temp_dir_name, check=True)
+        (repo / 'CODEOWNERS').write_text('*  @everyone\n*.py  @python\n')
+        (repo / 'src').mkdir()
+        (repo / 'src' / 'a.py').touch()
+        subprocess.run(['git', 'add', '-A'], cwd=temp_dir_name, check=True)
+        yield repo
+
+
+@pytest.fixture(scope='function')
+def ownership_server(repository_directory):
+    ownership_server = server.OwnershipServer(repository_directory, repository_directory / 'test.sock')
+    thread = threading.Thread(target=ownership_server.serve_forever)
+    thread.start()
+    try:
+        yield ownership_server
+    finally:
+        ownership_server.shutdown()
+        thread.join()
+        ownership_server.server_close()
+
+
+def test_server_match(repository_directory, ownership_server):
+    with server.Client(ownership_server.socket_path) as client:
+        assert client.match(['src/a.py', 'README']) == [
+            {'path': 'src/a.py', 'owners': ['@python'], 'source_filename': str(repository_directory / 'CODEOWNERS'),
+             'source_lineno': 2},
+            {'path': 'README', 'owners': ['@everyone'],
+             'source_filename': str(repository_directory / 'CODEOWNERS'), 'source_lineno': 1},
+        ]
+        assert client.owned_files('@python') == ['src/a.py']
+
+        # Rules and files are reloaded when they change on disk.
+        codeowners_path = repository_directory / 'CODEOWNERS'
+        codeowners_path.write_text('*  @everyone\n/src/  @src\n*.md  @docs\n')
+        os.utime(str(codeowners_path), ns=(0, 0))
+        (repository_directory / 'b.md').touch()
+        subprocess.run(['git', 'add', 'b.md'], cwd=str(repository_directory), check=True)
+
+        assert [r['owners'] for r in client.match(['src/a.py', 'README'])] == [['@everyone'], ['@everyone']]
+        assert client.owned_files('@docs') == ['b.md']
+
+        with pytest.raises(RuntimeError):
+            client.request({'unknown': 1})
+        assert client.owned_files('@nobody') == []
@@ -0,0 +1,94 @@
+""" Tests for `snapshots` module.  """
+
+from pathlib import Path
+import subprocess
+import tempfile
+
+import pytest
+
+from codeowners import cache, fs_utils, snapshots
+
+
+@pytest.fixture(autouse=True)
+def cache_directory(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+
+
+@pytest.fixture(scope='function')
+def repository_directory():
+    """Return a temporary git repository, with a CODEOWNERS file committed."""
+    with tempfile.TemporaryDirectory(prefix='test_snapshots_') as temp_dir_name:
+        repo = Path(temp_dir_name)
+        subprocess.run(['git', 'init', '-q'], cwd=temp_dir_name, check=True)
+        (repo / 'CODEOWNERS').write_text('*  @everyone\n*.py  @python\n')
+        (repo / 'src').mkdir()
+        (repo / 'src' / 'a.py').touch()
+        (repo / 'README').touch()
+        _commit(repo)
+        yield repo
+
+
+def _commit(repo):
+    subprocess.run(['git', 'add', '-A'], cwd=str(repo), check=True)
+    subprocess.run(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com', 'commit', '-q', '-m', 'Commit'],
+                   cwd=str(repo), check=True)
+
+
+def _owners(repo, snapshot_dir):
+    snapshot, rules = snapshots.revision_snapshot('HEAD', cwd=repo, snapshot_dir=snapshot_dir)
+    return {path: result.owners if result else None for path, result in snapshot.results(rules)}
+
+
+def test_revision_snapshot(repository_directory, tmpdir, monkeypatch):
+    repo = repository_directory
+    snapshot_dir = Path(str(tmpdir))
+    assert _owners(repo, snapshot_dir) == {'CODEOWNERS': ['@everyone'], 'README': ['@everyone'],
+                                           'src/a.py': ['@python']}
+
+    (repo / 'src' / 'a.py').unlink()
+    (repo / 'src' / 'b.py').touch()
+    _commit(repo)
+
+    # Only the files that changed since the previous snapshot are listed.
+    listed = []
+    diff_tree = fs_utils.diff_tree
+
+    def recording_diff_tree(*args, **kwargs):
+        listed.extend(diff_tree(*args, **kwargs))
+        return iter(listed)
+
+    monkeypatch.setattr(fs_utils, 'diff_tree', recording_diff_tree)
+    monkeypatch.setattr(fs_utils, 'list_tree_files', None)
+    assert _owners(repo, snapshot_dir) == {'CODEOWNERS': ['@everyone'], 'README': ['@everyone'],
+                                           'src/b.py': ['@python']}
+    assert sorted(listed) == [('A', 'src/b.py'), ('D', 'src/a.py')]
+
+
+def test_revision_snapshot_codeowners_changed(repository_directory, tmpdir):
+    repo = repository_directory
+    snapshot_dir = Path(str(tmpdir))
+    _owners(repo, snapshot_dir)
+
+    (repo / 'CODEOWNERS').write_text('*  @everyone\n/src/  @src\n')
+    _commit(repo)
+    assert _owners(repo, snapshot_dir) == {'CODEOWNERS': ['@everyone'], 'README': ['@everyone'],
+                                           'src/a.py': ['@everyone']}
+    assert len(list(snapshot_dir.glob('*.json.gz'))) == 2
+
+
+def test_load_snapshot_missing_or_corrupt(tmpdir):
+    snapshot_dir = Path(str(tmpdir))
+    assert snapshots.load_snapshot('0' * 40, snapshot_dir) is None
+    (snapshot_dir / ('0' * 40 + '.json.gz')).write_bytes(b'corrupt')
+    assert snapshots.load_snapshot('0' * 40, snapshot_dir) is None
+
+
+def test_load_snapshot_other_code(tmpdir, monkeypatch):
+    snapshot_dir = Path(str(tmpdir))
+    snapshot = snapshots.Snapshot(tree='0' * 40, codeowners_blob='1' * 40, source_linenos={'a.py': 2})
+    snapshots.save_snapshot(snapshot, snapshot_dir)
+    assert snapshots.load_snapshot('0' * 40, snapshot_dir) == snapshot
+
+    # Snapshots stored by a build with other matching code are not reused, even with the same version.
+    monkeypatch.setattr(cache, 'code_fingerprint', lambda: 'other')
+    assert snapshots.load_snapshot('0' * 40, snapshot_dir) is None